@@ -0,0 +1,312 @@
+"""Align a JSONL file of `NormalizedVariable` records against the referential.
+
+The input is streamed (one JSON object per line, blank lines ignored) in
+fixed-size batches: each batch is embedded in one call, obvious matches are
+answered by `src.matching.shortcut`, and the remaining variables are aligned
+by the LLM in candidate-sharing groups, at most `--concurrency` prompts at a
+time. Results are written in input order as JSONL, or as a directory of
+Parquet parts (`--format parquet`, needs `pyarrow`).
+
+Every `--checkpoint-every` records the output is flushed and a checkpoint
+(input offset, output size) is written next to it: rerunning the same
+command after a crash resumes after the last checkpoint.
+
+Run from `back/`:
+    python align_batch.py variables.jsonl alignments.jsonl [--concurrency 4]
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from src.classes import AlignmentLLMResponseList, AlignmentScore, NormalizedVariable, VariableAlignment
+from src.embedding import SemanticEmbedding, get_embedding_model
+from src.matching.matching_llm import align_group, plan_alignment_batches
+from src.matching.shortcut import ALIGN_SHORTCUT, shortcut_alignment
+from src.processing.referential import load_referential
+
+EMBEDDING_MODEL_NAME = "nomic-embed-text-v1.5"
+BATCH_SIZE = 64
+CONCURRENCY = 4
+CHECKPOINT_EVERY = 1000
+TOP_K = 5
+
+
+def iter_records(path, offset=0, index=0):
+    """Yield (record index, raw line, input offset after the line) from `offset`."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield index, line, offset
+                index += 1
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_json_atomic(path, data):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data, indent=2))
+    os.replace(tmp_path, path)
+
+
+class JsonlWriter:
+    """Appends result rows to a JSONL file; `flush` makes them durable."""
+
+    def __init__(self, path, state=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = (state or {}).get("output_bytes", 0)
+        if size and (not self.path.exists() or self.path.stat().st_size < size):
+            raise SystemExit(f"{self.path} is shorter than its checkpoint: use --restart")
+        self.file = open(self.path, "ab" if state else "wb")
+        # Drop the rows written after the last checkpoint
+        self.file.truncate(size)
+        self.file.seek(0, os.SEEK_END)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"output_bytes": self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes result rows as numbered Parquet parts in a directory, one part per `flush`."""
+
+    def __init__(self, path, state=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (`uv add pyarrow`), or use --format jsonl")
+        self.pa, self.pq = pa, pq
+        self.schema = parquet_schema(pa)
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.parts = (state or {}).get("parts", 0)
+        # Drop the parts written after the last checkpoint
+        for part in self.dir.glob("part-*.parquet"):
+            if int(part.stem.split("-")[1]) >= self.parts:
+                part.unlink()
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self):
+        if self.rows:
+            table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
+            path = self.dir / f"part-{self.parts:05d}.parquet"
+            tmp_path = path.with_name(path.name + ".tmp")
+            self.pq.write_table(table, tmp_path)
+            os.replace(tmp_path, path)
+            self.parts += 1
+            self.rows = []
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def parquet_schema(pa):
+    # Explicit schema: parts without any LLM answer must still match the others
+    items = pa.list_(pa.struct([("score", pa.float64()), ("ref_id", pa.string()), ("why_description", pa.string())]))
+    return pa.schema([
+        ("record", pa.int64()),
+        ("dataset_id", pa.string()),
+        ("trait_id", pa.string()),
+        ("candidates", pa.list_(pa.struct([("ref_id", pa.string()), ("score", pa.float64())]))),
+        ("alignments", pa.struct([("items", items)])),
+        ("shortcut", pa.string()),
+        ("error", pa.string()),
+    ])
+
+
+def invalid_row(index, line, error):
+    try:
+        raw = json.loads(line)
+    except ValueError:
+        raw = {}
+    raw = raw if isinstance(raw, dict) else {}
+    return {
+        "record": index,
+        "dataset_id": str(raw.get("dataset_id", "")),
+        "trait_id": str(raw.get("trait_id", "")),
+        "candidates": [],
+        "alignments": None,
+        "shortcut": None,
+        "error": f"invalid record: {error}",
+    }
+
+
+def align_records(records, semantic, refs, executor, top_k=TOP_K, use_llm=True, use_shortcut=ALIGN_SHORTCUT):
+    """Result rows (dicts, input order) of a batch of (index, line) records."""
+    rows, variables, positions = [], [], []
+    for index, line in records:
+        try:
+            variables.append(NormalizedVariable.model_validate_json(line))
+            positions.append(len(rows))
+            rows.append(None)
+        except ValidationError as e:
+            rows.append(invalid_row(index, line, e.errors()[0]["msg"]))
+    if not variables:
+        return rows
+
+    matches = semantic.get_best_matches_batch(variables, top_k=top_k)
+    results = [
+        VariableAlignment(
+            dataset_id=variable.dataset_id,
+            trait_id=variable.trait_id,
+            candidates=[AlignmentScore(ref_id=m["ref_id"], score=float(m["scores"])) for m in best_matches],
+        )
+        for variable, (best_matches, _) in zip(variables, matches)
+    ]
+    references = [[refs[i] for i in idx] for _, idx in matches]
+
+    pending = []
+    for i, (variable, (best_matches, _)) in enumerate(zip(variables, matches)):
+        shortcut = None
+        if use_shortcut:
+            shortcut = shortcut_alignment(variable, [(r, float(m["scores"])) for r, m in zip(references[i], best_matches)])
+        if shortcut is not None:
+            alignments, results[i].shortcut = shortcut
+            results[i].alignments = AlignmentLLMResponseList.model_validate(alignments)
+        elif use_llm:
+            pending.append(i)
+
+    groups = [[pending[i] for i in group] for group in plan_alignment_batches(
+        [variables[p] for p in pending], [references[p] for p in pending]
+    )]
+    futures = [
+        (group, executor.submit(align_group, [variables[i] for i in group], [references[i] for i in group]))
+        for group in groups
+    ]
+    for group, future in futures:
+        try:
+            for i, alignments in zip(group, future.result()):
+                results[i].alignments = AlignmentLLMResponseList.model_validate(alignments)
+        except Exception as e:
+            for i in group:
+                results[i].error = f"alignment error: {e}"
+
+    for position, result in zip(positions, results):
+        rows[position] = {"record": records[position][0], **result.model_dump()}
+    return rows
+
+
+def run(
+    input_path,
+    output_path,
+    output_format="jsonl",
+    batch_size=BATCH_SIZE,
+    concurrency=CONCURRENCY,
+    checkpoint_every=CHECKPOINT_EVERY,
+    top_k=TOP_K,
+    retrieval="dense",
+    use_llm=True,
+    use_shortcut=ALIGN_SHORTCUT,
+    restart=False,
+):
+    input_path, output_path = Path(input_path).resolve(), Path(output_path)
+    checkpoint_path = output_path.with_name(output_path.name + ".checkpoint.json")
+    state = None
+    if checkpoint_path.exists() and not restart:
+        state = json.loads(checkpoint_path.read_text())
+        if state.get("input") != str(input_path) or state.get("format") != output_format:
+            raise SystemExit(f"{checkpoint_path} belongs to another run ({state.get('input')}, {state.get('format')}): use --restart")
+        if state.get("done"):
+            print(f"Already complete: {state['records']} records in {output_path}")
+            return state
+        print(f"Resuming after record {state['records']}")
+
+    writer = (ParquetWriter if output_format == "parquet" else JsonlWriter)(output_path, state)
+    refs = load_referential()
+    semantic = SemanticEmbedding(
+        refs,
+        model_name=EMBEDDING_MODEL_NAME,
+        retrieval=retrieval,
+        model=get_embedding_model(EMBEDDING_MODEL_NAME),
+    )
+
+    state = state or {"input": str(input_path), "format": output_format, "records": 0, "offset": 0}
+    counts = {"shortcut": 0, "error": 0}
+    start, since_checkpoint, processed = time.perf_counter(), 0, 0
+
+    def checkpoint(offset, records, done=False):
+        state.update(writer.flush(), offset=offset, records=records, done=done)
+        write_json_atomic(checkpoint_path, state)
+        rate = processed / (time.perf_counter() - start)
+        print(f"{records} records done (this run: {rate:.1f}/s, {counts['shortcut']} shortcuts, {counts['error']} errors)")
+
+    offset, records = state["offset"], state["records"]
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="align") as executor:
+        try:
+            for batch in batched(iter_records(input_path, offset, records), batch_size):
+                rows = align_records([(i, line) for i, line, _ in batch], semantic, refs, executor, top_k, use_llm, use_shortcut)
+                writer.write(rows)
+                counts["shortcut"] += sum(1 for row in rows if row["shortcut"])
+                counts["error"] += sum(1 for row in rows if row["error"])
+                offset, records = batch[-1][2], batch[-1][0] + 1
+                processed += len(batch)
+                since_checkpoint += len(batch)
+                if since_checkpoint >= checkpoint_every:
+                    checkpoint(offset, records)
+                    since_checkpoint = 0
+            checkpoint(offset, records, done=True)
+        finally:
+            writer.close()
+    print(f"Saved: {output_path}")
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="python align_batch.py", description=__doc__.splitlines()[0])
+    parser.add_argument("input_path", help="JSONL file of NormalizedVariable records")
+    parser.add_argument("output_path", help="JSONL file, or directory of Parquet parts")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="records embedded per call")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help="LLM prompts in flight")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help="records between two output flushes / checkpoints")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--retrieval", choices=("dense", "hybrid"), default="dense")
+    parser.add_argument("--no-llm", action="store_true",
+                        help="retrieval (and shortcuts) only, no LLM alignment")
+    parser.add_argument("--no-shortcut", action="store_true",
+                        help="send every variable to the LLM")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore an existing checkpoint and start from the first record")
+    args = parser.parse_args()
+
+    run(
+        args.input_path,
+        args.output_path,
+        output_format=args.format,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_every=args.checkpoint_every,
+        top_k=args.top_k,
+        retrieval=args.retrieval,
+        use_llm=not args.no_llm,
+        use_shortcut=not args.no_shortcut,
+        restart=args.restart,
+    )
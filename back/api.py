@@ -1,19 +1,210 @@
-from fastapi import FastAPI, HTTPException, UploadFile
+import asyncio
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
+
+from src.executors import AdmissionGate, BoundedExecutor, CapacityError
+from src.extracting.chunking import CHUNK_MAX_TOKENS, chunk_pages
+from src.extracting.lm_studio_client import aclose_async_client
+from src.extracting.prefilter import get_prefilter
+from src.jobs import JobManager
+from src.extracting.main import (
+	DEFAULT_TRAITS,
+	aextract_traits_from_pages,
+	astream_traits_from_pages,
+	extract_pdf_to_dict,
+	load_template,
+	parse_file,
+)
+from src.processing.referential import REFERENTIAL_PATH, load_referential
+from src.classes import AlignmentLLMResponseList, AlignmentScore, NormalizedVariable, VariableAlignment
+from src.embedding import SemanticEmbedding, get_embedding_model
+from src.llm_cache import get_llm_cache
+from src.query_cache import get_query_cache
+from src.matching.shortcut import ALIGN_SHORTCUT, shortcut_alignment
+from src.state import ReferentialStore, ReferentialWatcher, Warmup
+
+# Max number of concurrent LLM calls for a batch alignment
+ALIGN_BATCH_CONCURRENCY = int(os.environ.get("ALIGN_BATCH_CONCURRENCY", "4"))
+# Align the variables of a batch that share candidates in one LLM prompt
+ALIGN_BATCH_GROUPED = os.environ.get("ALIGN_BATCH_GROUPED", "1") == "1"
+# Default / max number of PDF pages sent concurrently to the LLM by /uploadfile
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", "4"))
+EXTRACTION_MAX_WORKERS = int(os.environ.get("EXTRACTION_MAX_WORKERS", "8"))
+# Only send to the LLM the PDF pages that mention a trait (and their neighbours)
+EXTRACTION_PREFILTER = os.environ.get("EXTRACTION_PREFILTER", "1") == "1"
+# Only ask for the traits still incomplete, and stop once all are complete
+EXTRACTION_EARLY_STOP = os.environ.get("EXTRACTION_EARLY_STOP", "1") == "1"
+# Max number of /uploadfile and /uploadfile/stream extractions running at
+# once; beyond, the API answers 503 (background jobs: see JOB_WORKERS / JOB_QUEUE)
+EXTRACTION_MAX_CONCURRENT = int(os.environ.get("EXTRACTION_MAX_CONCURRENT", "4"))
+# Serve canned variables from /uploadfile instead of running the LLM extraction
+MOCK_UPLOAD = os.environ.get("MOCK_UPLOAD", "1") == "1"
+
+# Executors: threads for I/O-bound model calls (embedding + LLM), processes for
+# PDF conversion. Requests beyond workers + queue are rejected with a 503.
+LLM_EXECUTOR_WORKERS = int(os.environ.get("LLM_EXECUTOR_WORKERS", "8"))
+LLM_EXECUTOR_QUEUE = int(os.environ.get("LLM_EXECUTOR_QUEUE", "32"))
+PDF_EXECUTOR_WORKERS = int(os.environ.get("PDF_EXECUTOR_WORKERS", "2"))
+PDF_EXECUTOR_QUEUE = int(os.environ.get("PDF_EXECUTOR_QUEUE", "4"))
+# Seconds suggested to clients in the Retry-After header of a 503
+RETRY_AFTER_SECONDS = 5
+
+# Retrieval index: "flat" (exact) or "ivf" (approximate, for large referentials)
+REFERENTIAL_INDEX = os.environ.get("REFERENTIAL_INDEX", "flat")
+# IVF only: number of probed cells, higher = better recall, slower queries
+REFERENTIAL_INDEX_N_PROBE = int(os.environ.get("REFERENTIAL_INDEX_N_PROBE", "8"))
+# Candidate retrieval: "dense" (embedding similarity only) or "hybrid" (dense
+# + BM25 over character n-grams, fused by reciprocal rank)
+REFERENTIAL_RETRIEVAL = os.environ.get("REFERENTIAL_RETRIEVAL", "dense")
+# Storage of the normalized reference matrix: "float32" or "float16" (half memory, slower)
+REFERENTIAL_DTYPE = os.environ.get("REFERENTIAL_DTYPE", "float32")
+
+# Poll the ontology file every N seconds and hot-reload it on change (0 = off)
+REFERENTIAL_WATCH_SECONDS = float(os.environ.get("REFERENTIAL_WATCH_SECONDS", "0"))
+# If set, POST /admin/* requires this value in the X-Admin-Token header
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+EMBEDDING_MODEL_NAME = "nomic-embed-text-v1.5"
+# Load the models and build the referential index in the background at
+# startup (see /ready). With WARMUP=0 they are loaded by the first request
+# that needs them.
+WARMUP = os.environ.get("WARMUP", "1") == "1"
+
+
+def build_semantic_embedding(refs):
+	# Init the semantic embedding class and init the referential embedding
+	return SemanticEmbedding(
+		referential_json=refs,
+		model_name=EMBEDDING_MODEL_NAME,
+		model=get_embedding_model(EMBEDDING_MODEL_NAME),
+		index=REFERENTIAL_INDEX,
+		index_params={"n_probe": REFERENTIAL_INDEX_N_PROBE} if REFERENTIAL_INDEX == "ivf" else None,
+		dtype=REFERENTIAL_DTYPE,
+		retrieval=REFERENTIAL_RETRIEVAL,
+	)
+
+
+# Referentials, loaded lazily (nothing heavy runs at import). Handlers read
+# `referential_store.current` once per request: a reload swaps the whole
+# snapshot (refs + index) atomically.
+referential_store = ReferentialStore(load_referential, build_semantic_embedding)
+referential_watcher = ReferentialWatcher(referential_store, [REFERENTIAL_PATH], interval=REFERENTIAL_WATCH_SECONDS or 5.0)
+
+# Canned /uploadfile response (see MOCK_UPLOAD)
+MOCK_UPLOAD_RESPONSE = {
+	"variables": [
+		{
+		"trait_id": "VIGOUR",
+		"description": "Overall plant vigor assessed as a composite indicator of vegetative growth and plant health (e.g., canopy development, leafiness, stem robustness, color/greenness, and general uniformity). Typically used to compare treatments or genotypes at a given date or growth stage.",
+		"trait": "VIGOUR",
+		"method": "Visual vigor rating (field scoring on a predefined scale, e.g., 1–9)",
+		"unit": "score (1–9)"
+		},
+		{
+		"trait_id": "Shoot_Lenght",
+		"description": "Length of the main shoot (or the dominant shoot) measured from the shoot base (insertion point) to the apical tip. Used as an indicator of vegetative growth rate and treatment/genotype effects on elongation.",
+		"trait": "Shoot Lenght",
+		"method": "Manual measurement with ruler/tape on the main shoot (base-to-tip)",
+		"unit": "cm"
+		},
+		{
+		"trait_id": "Leaf_Area",
+		"description": "Total leaf area per plant (or per sampled shoot), reflecting the photosynthetically active surface. Often derived from direct leaf area measurement or image-based estimation, and used to assess canopy development and potential light interception.",
+		"trait": "Leaf Area",
+		"method": "Leaf area meter measurement (planimeter) on sampled leaves (sum per plant)",
+		"unit": "cm2"
+		},
+		{
+		"trait_id": "SPAD",
+		"description": "Relative leaf chlorophyll content index measured non-destructively on leaves. Frequently used as a proxy for leaf nitrogen status and photosynthetic capacity, and to monitor nutritional or stress effects over time.",
+		"trait": "SPAD",
+		"method": "SPAD meter reading (e.g., Minolta/Konica SPAD) on the mid-section of fully expanded leaves",
+		"unit": "SPAD units"
+		},
+		{
+		"trait_id": "Fresh_Aerial_Weight",
+		"description": "Fresh biomass of above-ground plant parts (shoots/stems/leaves; optionally excluding fruits depending on protocol) measured immediately after harvest to avoid dehydration. Indicator of vegetative biomass accumulation.",
+		"trait": "Fresh Aerial Weight",
+		"method": "Destructive sampling: harvest above-ground biomass and weigh immediately on a calibrated balance",
+		"unit": "g/plant"
+		},
+		{
+		"trait_id": "Fresh_Root_Weight",
+		"description": "Fresh biomass of the root system measured after uprooting and cleaning (removal of adhering soil) and weighing promptly. Indicator of below-ground biomass allocation and root development.",
+		"trait": "Fresh Root Weight",
+		"method": "Destructive sampling: uproot plant, wash roots, blot dry, then weigh on a calibrated balance",
+		"unit": "g/plant"
+		},
+		{
+		"trait_id": "Bud_Break",
+		"description": "Bud break progression quantified as the proportion of buds that have opened (visible green tissue) on a plant/shoot at a given observation date. Common phenological indicator to compare earliness and treatment/genotype effects.",
+		"trait": "Bud Break",
+		"method": "Field phenology scoring by counting opened buds vs total buds on tagged shoots/plants",
+		"unit": "%"
+		}
+	]
+}
+
+
+llm_executor = BoundedExecutor.threads("llm", LLM_EXECUTOR_WORKERS, LLM_EXECUTOR_QUEUE)
+pdf_executor = BoundedExecutor.processes("pdf", PDF_EXECUTOR_WORKERS, PDF_EXECUTOR_QUEUE)
+# Whole extractions (PDF conversion + LLM calls, which bypass llm_executor)
+extraction_gate = AdmissionGate("extraction", EXTRACTION_MAX_CONCURRENT)
+# Background extraction jobs (state persisted in SQLite, see src/jobs.py),
+# created by the lifespan: importing the module opens no database
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+	global _job_manager
+	with _job_manager_lock:
+		if _job_manager is None:
+			_job_manager = JobManager()
+		return _job_manager
+
+
+def warm_llm():
+	from src.matching.matching_llm import get_model
+
+	get_model()
+
 
-from src.extracting.main import extract_pdf_to_dict, parse_file
-from src.processing.referential import load_referential
-from src.classes import NormalizedVariable
-from src.embedding import SemanticEmbedding
+# Start-up steps run in the background by the lifespan, in this order
+warmup = Warmup(["referential", "embedding_model", "referential_index", "llm"])
+WARMUP_STEPS = [
+	("referential", lambda: referential_store.current),
+	("embedding_model", lambda: get_embedding_model(EMBEDDING_MODEL_NAME)),
+	("referential_index", lambda: referential_store.warm()),
+	("llm", warm_llm),
+]
 
-# Load Referentials
-refs = load_referential()
-# Init the semantic embedding class and init the referential embedding
-semantic_embedding = SemanticEmbedding(referential_json=refs, model_name="nomic-embed-text-v1.5")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	# Re-queue the jobs interrupted by the last shutdown
+	get_job_manager().resume()
+	# The port is bound right away; /ready reports when the models are loaded
+	if WARMUP:
+		warmup.start(WARMUP_STEPS)
+	if REFERENTIAL_WATCH_SECONDS > 0:
+		referential_watcher.start()
+	yield
+	referential_watcher.stop()
+	get_job_manager().shutdown(wait=False)
+	llm_executor.shutdown(wait=False)
+	pdf_executor.shutdown(wait=False)
+	await aclose_async_client()
 
-app = FastAPI(title="HackathonSIA2026 API")
+
+app = FastAPI(title="HackathonSIA2026 API", lifespan=lifespan)
 
 # Allow all CORS for now (adjust in production)
 app.add_middleware(
@@ -24,94 +215,350 @@ app.add_middleware(
 	allow_headers=["*"],
 )
 
+@app.get("/health")
+def health():
+	"""Liveness: the process is up and serving requests."""
+	return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+	"""Readiness: 200 once the referential index and the models are loaded,
+	503 before. The body gives the status and timing of each warm-up step."""
+	report = warmup.report() if WARMUP else {"ready": referential_store.ready, "seconds": None, "steps": {}}
+	if referential_store.ready:
+		state = referential_store.current
+		report["referential"] = {"version": state.version, "count": len(state.refs)}
+	return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
 @app.get("/core")
 def get_refs():
+	refs = referential_store.current.refs
 	items = [r.model_dump() for r in refs]
 	return {"count": len(refs), "items": items}
 
 
+@app.post("/admin/referential/reload")
+async def reload_referential(x_admin_token: Optional[str] = Header(None)):
+	"""Reload the ontology file without restarting.
+
+	Concepts are diffed by name and content hash, only changed concepts
+	are embedded, and the new index is swapped in atomically; requests
+	already running finish on the previous version.
+	"""
+	if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+		raise HTTPException(status_code=403, detail="invalid admin token")
+	try:
+		return await asyncio.to_thread(referential_store.reload)
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"reload error: {e}")
+
+
+def over_capacity(e: CapacityError) -> HTTPException:
+	return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+def indexed_state():
+	"""Current referential snapshot with its retrieval index.
+
+	While the background warm-up builds the index, raise a 503; without
+	warm-up, build it here on first use.
+	"""
+	state = referential_store.current
+	if state.semantic_embedding is not None:
+		return state
+	if WARMUP:
+		detail = f"warm-up failed ({warmup.error}), retry with POST /admin/referential/reload" if warmup.error else "referential index is warming up"
+		raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+	return referential_store.warm()
+
+
+@app.get("/cache/stats")
+def cache_stats():
+	"""Hit/miss counters of the LLM response and query embedding caches."""
+	return {"llm": get_llm_cache().stats(), "query_embeddings": get_query_cache().stats()}
+
+
+@app.get("/executors/stats")
+def executors_stats():
+	"""Load of the model-call and PDF executors, of the extractions and of the job pool."""
+	return {
+		"llm": llm_executor.stats(),
+		"pdf": pdf_executor.stats(),
+		"extraction": extraction_gate.stats(),
+		"jobs": get_job_manager().stats(),
+	}
+
+
+def shortcut_candidates(variable, refs, best_matches):
+	"""`shortcut_alignment` on retrieval results (None when ALIGN_SHORTCUT=0)."""
+	if not ALIGN_SHORTCUT:
+		return None
+	return shortcut_alignment(variable, [(ref, float(m["scores"])) for ref, m in zip(refs, best_matches)])
+
+
+def align_one(variable: NormalizedVariable):
+	from src.matching.matching_llm import align_variable
+
+	state = indexed_state()
+	# TODO: add refs that are in the top n.
+	best_matches, idx = state.semantic_embedding.get_best_matches(variable, top_k=5)
+	best_refs = [state.refs[i] for i in idx]
+	shortcut = shortcut_candidates(variable, best_refs, best_matches)
+	if shortcut is not None:
+		return shortcut[0]
+	return align_variable(variable, best_refs)
+
+
 @app.post("/align")
-def align(variable: NormalizedVariable):
+async def align(variable: NormalizedVariable):
 	"""Align a `NormalizedVariable` against the referential.
 
-	This endpoint lazy-imports the alignment function to avoid heavy
+	Obvious matches (exact alias / name, or a similarity far above the
+	other candidates, see `src.matching.shortcut`) are answered from the
+	retrieval scores without calling the LLM. The embedding and LLM round trip runs on the bounded model-call
+	executor; the alignment function is lazy-imported there to avoid heavy
 	initialization at import time.
 	"""
 	try:
-		# lazy import to avoid initializing LM Studio on import
-		from src.matching.matching_llm import align_variable
+		alignments = await llm_executor.run(align_one, variable)
+	except CapacityError as e:
+		raise over_capacity(e)
+	except HTTPException:
+		raise
+	except Exception as e:
+		raise HTTPException(status_code=500, detail=f"alignment error: {e}")
+
+	return alignments
+
+
+@app.post("/align/batch", response_model=List[VariableAlignment])
+async def align_batch(variables: List[NormalizedVariable], top_k: int = 5):
+	"""Align several `NormalizedVariable`s against the referential.
+
+	All variables are embedded in one call and scored with one matrix
+	multiply; the LLM alignments then run concurrently (at most
+	`ALIGN_BATCH_CONCURRENCY` at a time on the model-call executor). A
+	failing variable is reported in its own `error` field instead of
+	failing the batch; a full executor answers 503.
+
+	Variables with an obvious match skip the LLM (see `/align`); the
+	rule that fired is reported in their `shortcut` field.
+
+	With `ALIGN_BATCH_GROUPED`, variables sharing candidates are aligned
+	together in one prompt (see `plan_alignment_batches` and `align_group`);
+	a variable missing from a grouped answer falls back to its own prompt,
+	and a failing group reports its error on each of its variables.
+	"""
+	try:
+		from src.matching.matching_llm import align_group, plan_alignment_batches
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"failed to import alignment function: {e}")
 
+	state = await asyncio.to_thread(indexed_state)
 	try:
-		# TODO: add refs that are in the top n.
-		best_matches, idx = semantic_embedding.get_best_matches(variable, top_k=5) # best_matches not usefull so far (scores)
-		best_refs = [refs[i] for i in idx]
-		alignments = align_variable(variable, best_refs)
+		matches = await llm_executor.run(state.semantic_embedding.get_best_matches_batch, variables, top_k=top_k)
+	except CapacityError as e:
+		raise over_capacity(e)
 	except Exception as e:
 		raise HTTPException(status_code=500, detail=f"alignment error: {e}")
 
-	return alignments
+	results = [
+		VariableAlignment(
+			dataset_id=variable.dataset_id,
+			trait_id=variable.trait_id,
+			candidates=[AlignmentScore(ref_id=m["ref_id"], score=float(m["scores"])) for m in best_matches],
+		)
+		for variable, (best_matches, _) in zip(variables, matches)
+	]
+	if not results:
+		return results
+
+	semaphore = asyncio.Semaphore(ALIGN_BATCH_CONCURRENCY)
+	references = [[state.refs[i] for i in idx] for _, idx in matches]
+
+	pending = []
+	for position, (best_matches, _) in enumerate(matches):
+		shortcut = shortcut_candidates(variables[position], references[position], best_matches)
+		if shortcut is None:
+			pending.append(position)
+		else:
+			alignments, results[position].shortcut = shortcut
+			results[position].alignments = AlignmentLLMResponseList.model_validate(alignments)
+
+	async def align_one_group(group):
+		async with semaphore:
+			try:
+				aligned = await llm_executor.run(
+					align_group, [variables[i] for i in group], [references[i] for i in group]
+				)
+			except CapacityError:
+				raise
+			except Exception as e:
+				for position in group:
+					results[position].error = f"alignment error: {e}"
+				return
+		for position, alignments in zip(group, aligned):
+			results[position].alignments = AlignmentLLMResponseList.model_validate(alignments)
+
+	if ALIGN_BATCH_GROUPED:
+		groups = [[pending[i] for i in group] for group in plan_alignment_batches(
+			[variables[p] for p in pending], [references[p] for p in pending]
+		)]
+	else:
+		groups = [[position] for position in pending]
+	try:
+		await asyncio.gather(*(align_one_group(group) for group in groups))
+	except CapacityError as e:
+		raise over_capacity(e)
+
+	return results
 
 
 
+def prepare_pages(pages: dict) -> dict:
+	"""Drop the pages mentioning no trait (see `EXTRACTION_PREFILTER`) and
+	pack / split the rest into token-budgeted chunks.
+
+	CPU-bound (and loads the referential on first use): call it off the
+	event loop."""
+	if EXTRACTION_PREFILTER:
+		# Built once per referential version
+		snapshot = referential_store.current
+		prefilter = get_prefilter(DEFAULT_TRAITS, version=("store", snapshot.version), concepts=snapshot.refs)
+		pages = prefilter.filter_pages(pages)
+	return chunk_pages(pages)
+
+
 @app.post("/uploadfile")
-async def create_upload_file(file: UploadFile):
-    return {
-		"variables": [
-			{
-			"trait_id": "VIGOUR",
-			"description": "Overall plant vigor assessed as a composite indicator of vegetative growth and plant health (e.g., canopy development, leafiness, stem robustness, color/greenness, and general uniformity). Typically used to compare treatments or genotypes at a given date or growth stage.",
-			"trait": "VIGOUR",
-			"method": "Visual vigor rating (field scoring on a predefined scale, e.g., 1–9)",
-			"unit": "score (1–9)"
-			},
-			{
-			"trait_id": "Shoot_Lenght",
-			"description": "Length of the main shoot (or the dominant shoot) measured from the shoot base (insertion point) to the apical tip. Used as an indicator of vegetative growth rate and treatment/genotype effects on elongation.",
-			"trait": "Shoot Lenght",
-			"method": "Manual measurement with ruler/tape on the main shoot (base-to-tip)",
-			"unit": "cm"
-			},
-			{
-			"trait_id": "Leaf_Area",
-			"description": "Total leaf area per plant (or per sampled shoot), reflecting the photosynthetically active surface. Often derived from direct leaf area measurement or image-based estimation, and used to assess canopy development and potential light interception.",
-			"trait": "Leaf Area",
-			"method": "Leaf area meter measurement (planimeter) on sampled leaves (sum per plant)",
-			"unit": "cm2"
-			},
-			{
-			"trait_id": "SPAD",
-			"description": "Relative leaf chlorophyll content index measured non-destructively on leaves. Frequently used as a proxy for leaf nitrogen status and photosynthetic capacity, and to monitor nutritional or stress effects over time.",
-			"trait": "SPAD",
-			"method": "SPAD meter reading (e.g., Minolta/Konica SPAD) on the mid-section of fully expanded leaves",
-			"unit": "SPAD units"
-			},
-			{
-			"trait_id": "Fresh_Aerial_Weight",
-			"description": "Fresh biomass of above-ground plant parts (shoots/stems/leaves; optionally excluding fruits depending on protocol) measured immediately after harvest to avoid dehydration. Indicator of vegetative biomass accumulation.",
-			"trait": "Fresh Aerial Weight",
-			"method": "Destructive sampling: harvest above-ground biomass and weigh immediately on a calibrated balance",
-			"unit": "g/plant"
-			},
-			{
-			"trait_id": "Fresh_Root_Weight",
-			"description": "Fresh biomass of the root system measured after uprooting and cleaning (removal of adhering soil) and weighing promptly. Indicator of below-ground biomass allocation and root development.",
-			"trait": "Fresh Root Weight",
-			"method": "Destructive sampling: uproot plant, wash roots, blot dry, then weigh on a calibrated balance",
-			"unit": "g/plant"
-			},
-			{
-			"trait_id": "Bud_Break",
-			"description": "Bud break progression quantified as the proportion of buds that have opened (visible green tissue) on a plant/shoot at a given observation date. Common phenological indicator to compare earliness and treatment/genotype effects.",
-			"trait": "Bud Break",
-			"method": "Field phenology scoring by counting opened buds vs total buds on tagged shoots/plants",
-			"unit": "%"
-			}
-		]
-		}
-	# if file.content_type == "application/pdf":
-	# 	bytes = await file.read()
-	# 	result = parse_file(bytes)
-	# 	return {"variables": result}
-	# return {"variables": []}
\ No newline at end of file
+async def create_upload_file(
+	file: UploadFile,
+	workers: int = Query(EXTRACTION_WORKERS, ge=1, le=EXTRACTION_MAX_WORKERS),
+):
+	if MOCK_UPLOAD:
+		return MOCK_UPLOAD_RESPONSE
+	if file.content_type == "application/pdf":
+		try:
+			extraction_gate.acquire()
+		except CapacityError as e:
+			raise over_capacity(e)
+		try:
+			bytes = await file.read()
+			try:
+				# pymupdf layout analysis is CPU-bound: run it in the process pool
+				pages = await pdf_executor.run(extract_pdf_to_dict, bytes)
+			except CapacityError as e:
+				raise over_capacity(e)
+			pages = await asyncio.to_thread(prepare_pages, pages)
+			results = await aextract_traits_from_pages(
+				DEFAULT_TRAITS, pages, load_template(), max_workers=workers, early_stop=EXTRACTION_EARLY_STOP
+			)
+		finally:
+			extraction_gate.release()
+		return {"variables": list(results.values())}
+	return {"variables": []}
+
+
+def sse_event(event: str, data) -> str:
+	return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/uploadfile/stream")
+async def stream_upload_file(
+	file: UploadFile,
+	workers: int = Query(EXTRACTION_WORKERS, ge=1, le=EXTRACTION_MAX_WORKERS),
+):
+	"""Server-sent events version of `/uploadfile`.
+
+	One `page` event is pushed per LLM chunk (see `chunk_pages`), in page
+	order, as soon as its result is merged: `{"page", "total_pages",
+	"found", "variables"}` where `page` is the chunk label ("4", "4-6",
+	"7 [2/3]") and `variables` the merged state so far. A final `done` event carries
+	`{"variables"}`; a failure ends the stream with an `error` event.
+	"""
+	if MOCK_UPLOAD:
+		events = [sse_event("done", MOCK_UPLOAD_RESPONSE)]
+		return StreamingResponse(iter(events), media_type="text/event-stream")
+	if file.content_type != "application/pdf":
+		raise HTTPException(status_code=415, detail="expected a PDF file")
+	try:
+		extraction_gate.acquire()
+	except CapacityError as e:
+		raise over_capacity(e)
+	try:
+		bytes = await file.read()
+		try:
+			pages = await pdf_executor.run(extract_pdf_to_dict, bytes)
+		except CapacityError as e:
+			raise over_capacity(e)
+		total_pages = len(pages)
+		pages = await asyncio.to_thread(prepare_pages, pages)
+	except BaseException:
+		extraction_gate.release()
+		raise
+
+	async def events():
+		# The slot taken above is held until the stream ends
+		variables = []
+		try:
+			async for page_num, found, results in astream_traits_from_pages(
+				DEFAULT_TRAITS, pages, load_template(), max_workers=workers, early_stop=EXTRACTION_EARLY_STOP
+			):
+				variables = list(results.values())
+				yield sse_event("page", {
+					"page": str(page_num),
+					"total_pages": total_pages,
+					"found": found,
+					"variables": variables,
+				})
+		except Exception as e:
+			yield sse_event("error", {"detail": f"extraction error: {e}"})
+			return
+		finally:
+			extraction_gate.release()
+		yield sse_event("done", {"variables": variables})
+
+	# No buffering by a reverse proxy: events must reach the client right away
+	return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/jobs/extract", status_code=202)
+async def create_extraction_job(
+	file: UploadFile,
+	excel: Optional[UploadFile] = None,
+	workers: int = Query(EXTRACTION_WORKERS, ge=1, le=EXTRACTION_MAX_WORKERS),
+):
+	"""Start a background extraction of a PDF and return its job id.
+
+	Traits are read from the optional `excel` file, `DEFAULT_TRAITS`
+	otherwise. The job runs with the settings of `/uploadfile`
+	(`EXTRACTION_PREFILTER`, `EXTRACTION_EARLY_STOP`, `CHUNK_MAX_TOKENS`).
+	Poll `GET /jobs/{job_id}` for progress and partial results.
+	"""
+	if file.content_type != "application/pdf":
+		raise HTTPException(status_code=415, detail="expected a PDF file")
+	pdf = await file.read()
+	excel_bytes = await excel.read() if excel is not None else None
+	try:
+		job_id = await asyncio.to_thread(
+			get_job_manager().submit,
+			pdf,
+			excel_bytes,
+			workers,
+			prefilter=EXTRACTION_PREFILTER,
+			early_stop=EXTRACTION_EARLY_STOP,
+			chunk_tokens=CHUNK_MAX_TOKENS,
+		)
+	except CapacityError as e:
+		raise over_capacity(e)
+	return {"job_id": job_id}
+
+
+@app.get("/jobs/{job_id}")
+def get_extraction_job(job_id: str):
+	"""Status, page progress and (partial) extracted variables of a job."""
+	job = get_job_manager().get(job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail="unknown job")
+	return job
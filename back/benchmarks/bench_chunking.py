@@ -0,0 +1,84 @@
+"""Benchmark of extraction prompt chunking on the sample PDFs.
+
+Compares, for every PDF in `data/raw/pdf` (converted markdown comes from the
+page cache after the first run):
+  - before: one LLM call per page
+  - after: `iter_chunks` packing small pages / splitting large ones under
+    several token budgets, with and without the lexical pre-filter
+
+Reports the number of LLM calls, prompt tokens (template included), the
+largest prompt and how many prompts exceed the budget. Coverage is checked:
+every line of every kept page must appear in some chunk, and every trait
+mentioned on a page must be mentioned in a chunk covering that page.
+
+Run from `back/`:
+    python -m benchmarks.bench_chunking [--budgets 1500 3000 6000]
+"""
+import argparse
+import time
+from pathlib import Path
+
+from src.extracting.chunking import CHUNK_OVERLAP_TOKENS, iter_chunks
+from src.extracting.main import DEFAULT_TRAITS, build_prompt, extract_pdf_to_dict, load_template
+from src.extracting.prefilter import build_prefilter
+from src.tokens import estimate_tokens
+
+PDF_DIR = Path(__file__).resolve().parent.parent / "data" / "raw" / "pdf"
+BUDGETS = [1_500, 3_000, 6_000]
+
+
+def prompt_tokens(units, template):
+    return [estimate_tokens(build_prompt(DEFAULT_TRAITS, content, template)) for _, content in units]
+
+
+def check_coverage(pages, chunks, prefilter):
+    """Lines and trait mentions of each page that no chunk covers."""
+    missing_lines = missing_mentions = 0
+    for page_num, content in pages.items():
+        covering = [text for chunk, text in chunks if chunk.first_page <= page_num <= chunk.last_page]
+        joined = "\n".join(covering)
+        missing_lines += sum(1 for line in content.splitlines() if line.strip() and line not in joined)
+        found = set().union(*(prefilter.mentions(text) for text in covering)) if covering else set()
+        missing_mentions += len(set(prefilter.mentions(content)) - found)
+    return missing_lines, missing_mentions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", type=Path, default=PDF_DIR)
+    parser.add_argument("--budgets", type=int, nargs="+", default=BUDGETS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    template = load_template()
+    prefilter = build_prefilter(DEFAULT_TRAITS)
+    header = f"{'pdf':<36} {'variant':<22} {'calls':>5} {'tokens':>7} {'max':>6} {'over':>4} {'ms':>7} {'lost':>9}"
+    print(header)
+    for pdf in sorted(args.pdf_dir.glob("*.pdf")):
+        pages = extract_pdf_to_dict(pdf)
+        kept = prefilter.filter_pages(pages)
+        rows = []
+
+        for label, source in (("", pages), ("prefilter, ", kept)):
+            units = sorted(source.items())
+            tokens = prompt_tokens(units, template)
+            rows.append((f"{label}per page", len(units), sum(tokens), max(tokens, default=0), None, 0.0, ""))
+
+            for budget in args.budgets:
+                start = time.perf_counter()
+                chunks = list(iter_chunks(units, max_tokens=budget, overlap_tokens=args.overlap))
+                elapsed = (time.perf_counter() - start) * 1e3
+                tokens = prompt_tokens(chunks, template)
+                over = sum(1 for _, content in chunks if estimate_tokens(content) > budget)
+                lines, mentions = check_coverage(source, chunks, prefilter)
+                rows.append((f"{label}chunks {budget}", len(chunks), sum(tokens), max(tokens, default=0), over, elapsed, f"{lines}/{mentions}"))
+
+        for variant, calls, total, largest, over, elapsed, lost in rows:
+            over = "-" if over is None else over
+            print(f"{pdf.name[:36]:<36} {variant:<22} {calls:>5} {total:>7} {largest:>6} {over:>4} {elapsed:>7.1f} {lost:>9}")
+    print("\ntokens = estimated prompt tokens incl. template; over = chunks whose content exceeds the budget;")
+    print("lost = page lines / trait mentions not covered by any chunk (must be 0/0)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""A/B benchmark of candidate serialization in alignment prompts.
+
+On a fixed set of variables (held-out ontology aliases, see
+`bench_retrieval`, plus the variables of `metadata_variables.xlsx`) with
+their top-k lexical candidates, compares:
+  - A: `ALIGN_PROMPT_FORMAT=json`, candidates as indented JSON dumps
+  - B: `ALIGN_PROMPT_FORMAT=compact`, deduped / truncated text blocks
+
+Always reports estimated prompt tokens (total, mean, max). With `--llm`
+(needs LM Studio), also runs `align_variable` with both formats and reports
+the latency and the agreement of B with A: same top-1 ref_id, and overlap
+of the returned ref_id sets. Run it with `LLM_CACHE=0` to time real calls.
+
+Run from `back/`:
+    python -m benchmarks.bench_prompt_compaction [--llm] [--limit 40]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.bench_retrieval import held_out_queries
+from src.classes import NormalizedVariable
+from src.lexical import LexicalIndex, build_dataset_lexical_string
+from src.matching.matching_llm import SYSTEM_PROMT, align_variable, buildPrompt
+from src.processing.referential import load_referential
+from src.tokens import estimate_tokens
+
+METADATA_PATH = Path(__file__).resolve().parent.parent / "data" / "raw" / "excel" / "metadata_variables.xlsx"
+FORMATS = ("json", "compact")
+TOP_K = 5
+
+
+def metadata_variables(path=METADATA_PATH):
+    df = pd.read_excel(path).fillna("")
+    return [
+        NormalizedVariable(
+            dataset_id=str(row["dataset_id"]),
+            trait_id=str(row["trait_id"]),
+            trait=str(row["trait"]),
+            method=str(row["method"]),
+            unit=str(row["unit"]),
+            description=str(row["description"]),
+            aliases="",
+        )
+        for _, row in df.iterrows()
+    ]
+
+
+def fixed_cases(limit):
+    """(variable, candidates) pairs, identical from one run to the next."""
+    refs = load_referential()
+    _, queries = held_out_queries(refs)
+    variables = metadata_variables() + [variable for variable, _ in queries][:limit]
+    index = LexicalIndex(refs)
+    _, idx = index.search([build_dataset_lexical_string(v) for v in variables], top_k=TOP_K)
+    return [(v, [refs[i] for i in row if i >= 0]) for v, row in zip(variables, idx)]
+
+
+def ref_ids(alignments):
+    return [item["ref_id"] for item in alignments["items"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=40, help="number of held-out alias variables")
+    parser.add_argument("--llm", action="store_true", help="also align with both formats (needs LM Studio)")
+    args = parser.parse_args()
+
+    cases = fixed_cases(args.limit)
+    print(f"{len(cases)} variables, top-{TOP_K} candidates")
+    print(f"{'format':<8} {'tokens':>8} {'mean':>7} {'max':>6}")
+    for prompt_format in FORMATS:
+        tokens = [estimate_tokens(SYSTEM_PROMT + "\n\n" + buildPrompt(v, refs, prompt_format)) for v, refs in cases]
+        print(f"{prompt_format:<8} {sum(tokens):>8} {sum(tokens) / len(tokens):>7.0f} {max(tokens):>6}")
+
+    if not args.llm:
+        return
+    answers, seconds = {}, {}
+    for prompt_format in FORMATS:
+        start = time.perf_counter()
+        answers[prompt_format] = [ref_ids(align_variable(v, refs, prompt_format=prompt_format)) for v, refs in cases]
+        seconds[prompt_format] = time.perf_counter() - start
+    same_top1 = sum(bool(a) and bool(b) and a[0] == b[0] for a, b in zip(answers["json"], answers["compact"]))
+    overlap = [
+        len(set(a) & set(b)) / len(set(a) | set(b)) if a or b else 1.0
+        for a, b in zip(answers["json"], answers["compact"])
+    ]
+    print(f"\nlatency: json {seconds['json']:.1f}s, compact {seconds['compact']:.1f}s")
+    print(f"agreement: same top-1 {same_top1}/{len(cases)}, mean ref_id overlap (Jaccard) {sum(overlap) / len(overlap):.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Scaling benchmark of referential consolidation.
+
+Compares, on synthetic ontologies of 10k / 100k / 1M entries spread over a
+fixed set of characteristics (as when several crop ontologies are merged,
+every characteristic accumulates more variants):
+  - before: list membership for units / methods / aliases and a substring
+    check on the growing '|'-joined description (quadratic per concept)
+  - after: `convert_entries_to_reference_concepts` with insertion-ordered sets
+
+Also times `load_and_convert_referentials` streaming the same entries from
+several JSON files, and checks that both versions produce identical
+concepts (synthetic descriptions are fixed-width, so the legacy substring
+check has no false positives).
+
+Run from `back/`:
+    python -m benchmarks.bench_referential [--sizes 10000 100000 1000000]
+"""
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from pydantic import ValidationError
+
+from src.classes import ReferenceConcept
+from src.processing.referential import convert_entries_to_reference_concepts, load_and_convert_referentials
+
+SIZES = [10_000, 100_000, 1_000_000]
+N_CONCEPTS = 1_000
+N_FILES = 4
+PAGE_SIZE = 1_000
+
+
+def legacy_convert(entries):
+    """`convert_entries_to_reference_concepts` before the set-based rewrite."""
+    dct = {}
+    for entry in entries:
+        characteristic = entry.get("characteristic")
+        if isinstance(characteristic, dict):
+            name = characteristic.get("name")
+
+        unit = entry.get('unit').get('name')
+        method = entry.get('method').get('name')
+        description = entry.get("alternative_name")
+        short_name = entry.get("name")
+        if name not in dct:
+            dct[name] = {
+                'name': name,
+                'units': [unit],
+                'methods': [method],
+                'description': description,
+                'aliases': [short_name]
+            }
+        else:
+            item = dct[name]
+            if unit not in item['units']:
+                item['units'].append(unit)
+            if method not in item['methods']:
+                item['methods'].append(method)
+            if description not in item['description']:
+                item['description'] += '|' + description
+            if short_name not in item['aliases']:
+                item['aliases'].append(short_name)
+
+    results = []
+    for i, item in enumerate(dct.values(), start=1):
+        item['ref_id'] = f"ref_{i}"
+        try:
+            results.append(ReferenceConcept(**item))
+        except ValidationError:
+            continue
+    return results
+
+
+def synthetic_entries(n, n_concepts=N_CONCEPTS):
+    for i in range(n):
+        concept = i % n_concepts
+        yield {
+            "name": f"ALIAS_{i // n_concepts % 500:04d}_{concept:05d}",
+            "alternative_name": f"description {i // n_concepts % 2000:07d} of characteristic {concept:05d}",
+            "characteristic": {"name": f"Characteristic {concept:05d}"},
+            "unit": {"name": f"unit_{i % 37:02d}"},
+            "method": {"name": f"method_{i % 53:02d}"},
+        }
+
+
+def write_ontologies(entries, directory, n_files=N_FILES):
+    """Split entries over `n_files` raw-ontology JSON files (pages of `result`)."""
+    entries = list(entries)
+    per_file = -(-len(entries) // n_files)
+    paths = []
+    for k in range(n_files):
+        chunk = entries[k * per_file:(k + 1) * per_file]
+        pages = [{"result": chunk[j:j + PAGE_SIZE]} for j in range(0, len(chunk), PAGE_SIZE)]
+        path = Path(directory) / f"ontology_{k}.json"
+        path.write_text(json.dumps(pages))
+        paths.append(path)
+    return paths
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(fn, *args):
+    """Peak Python allocation in MB (separate run: tracemalloc slows the code down)."""
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--concepts", type=int, default=N_CONCEPTS)
+    parser.add_argument("--legacy-max", type=int, default=100_000,
+                        help="skip the legacy version above this many entries")
+    args = parser.parse_args()
+
+    print(f"{'entries':>9} {'variant':<24} {'seconds':>8} {'peak MB':>8} {'concepts':>8}")
+    for n in args.sizes:
+        entries = list(synthetic_entries(n, args.concepts))
+        after, seconds = timed(convert_entries_to_reference_concepts, entries)
+        print(f"{n:>9} {'after (sets)':<24} {seconds:>8.2f} {'':>8} {len(after):>8}")
+
+        if n <= args.legacy_max:
+            before, seconds = timed(legacy_convert, entries)
+            print(f"{n:>9} {'before (lists)':<24} {seconds:>8.2f} {'':>8} {len(before):>8}")
+            if before != after:
+                print(f"{n:>9} outputs differ")
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_ontologies(entries, directory)
+            del entries
+            streamed, seconds = timed(load_and_convert_referentials, paths)
+            peak = peak_memory(load_and_convert_referentials, paths)
+            print(f"{n:>9} {f'after, {len(paths)} files':<24} {seconds:>8.2f} {peak:>8.1f} {len(streamed):>8}")
+            if streamed != after:
+                print(f"{n:>9} multi-file output differs")
+
+
+if __name__ == "__main__":
+    main()
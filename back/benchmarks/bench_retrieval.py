@@ -0,0 +1,101 @@
+"""Recall benchmark of candidate retrieval on held-out referential aliases.
+
+Every other alias of each concept (the cryptic variable ids of the
+ontology: `BER_MAL_HPLC`, `MUST_K`, ...) is removed from the referential
+and used as a query (`trait_id`, plus the concept first unit), so the
+alias cannot be matched verbatim. Compares:
+  - lexical: BM25 over character n-grams (`LexicalIndex`)
+  - dense: embedding similarity (`SemanticEmbedding` flat index)
+  - hybrid: both fused by reciprocal rank fusion (`retrieval="hybrid"`);
+    R@k is the recall of the k fused candidates, which `SemanticEmbedding`
+    then orders by cosine similarity (MRR is computed on the fused rank)
+
+The dense and hybrid rows need a running LM Studio (`--dense`).
+
+Run from `back/`:
+    python -m benchmarks.bench_retrieval [--dense] [--ks 1 3 5 10]
+"""
+import argparse
+import time
+
+from src.classes import NormalizedVariable
+from src.embedding import HYBRID_DEPTH, SemanticEmbedding, build_var_embeddings
+from src.lexical import LexicalIndex, build_dataset_lexical_string, reciprocal_rank_fusion
+from src.processing.referential import load_referential
+
+KS = [1, 3, 5, 10]
+
+
+def held_out_queries(refs):
+    """Referential without the held-out aliases, and (variable, concept index) queries."""
+    kept, queries = [], []
+    for i, concept in enumerate(refs):
+        held_out = concept.aliases[1::2]
+        kept.append(concept.model_copy(update={"aliases": concept.aliases[::2]}))
+        for alias in held_out:
+            variable = NormalizedVariable(
+                dataset_id="bench",
+                trait_id=alias,
+                trait=alias.replace("_", " "),
+                method="",
+                unit=concept.units[0] if concept.units else "",
+                description="",
+                aliases="",
+            )
+            queries.append((variable, i))
+    return kept, queries
+
+
+def evaluate(rankings, truth, ks):
+    """Recall@k for each k and MRR over the rankings (concept indices, best first)."""
+    recalls = {k: 0 for k in ks}
+    mrr = 0.0
+    for ranking, target in zip(rankings, truth):
+        ranking = [int(i) for i in ranking]
+        if target in ranking:
+            rank = ranking.index(target) + 1
+            mrr += 1 / rank
+            for k in ks:
+                recalls[k] += rank <= k
+    n = len(truth)
+    return {k: recalls[k] / n for k in ks}, mrr / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ks", type=int, nargs="+", default=KS)
+    parser.add_argument("--dense", action="store_true", help="also run dense and hybrid retrieval (needs LM Studio)")
+    args = parser.parse_args()
+
+    refs, queries = held_out_queries(load_referential())
+    variables = [variable for variable, _ in queries]
+    truth = [target for _, target in queries]
+    depth = max(max(args.ks), HYBRID_DEPTH)
+    print(f"{len(refs)} concepts, {len(queries)} held-out alias queries")
+
+    rows = []
+    start = time.perf_counter()
+    lexical_index = LexicalIndex(refs)
+    _, lexical = lexical_index.search([build_dataset_lexical_string(v) for v in variables], top_k=depth)
+    rows.append(("lexical", lexical, time.perf_counter() - start))
+
+    if args.dense:
+        start = time.perf_counter()
+        semantic = SemanticEmbedding(refs, cache_dir=None)
+        embeddings = build_var_embeddings(semantic.model, variables)
+        _, dense = semantic.index.search(embeddings, top_k=depth)
+        rows.append(("dense", dense, time.perf_counter() - start))
+        hybrid = [reciprocal_rank_fusion([d, l], top_k=depth) for d, l in zip(dense, lexical)]
+        rows.append(("hybrid", hybrid, None))
+
+    header = " ".join(f"{f'R@{k}':>6}" for k in args.ks)
+    print(f"{'variant':<10} {header} {'MRR':>6} {'seconds':>8}")
+    for name, rankings, seconds in rows:
+        recalls, mrr = evaluate(rankings, truth, args.ks)
+        cells = " ".join(f"{recalls[k]:>6.3f}" for k in args.ks)
+        seconds = "" if seconds is None else f"{seconds:.2f}"
+        print(f"{name:<10} {cells} {mrr:>6.3f} {seconds:>8}")
+
+
+if __name__ == "__main__":
+    main()
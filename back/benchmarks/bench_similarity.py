@@ -0,0 +1,75 @@
+"""Micro-benchmark of referential retrieval (per-query latency and memory).
+
+Compares, for several referential sizes:
+  - before: `compute_similarity` re-normalizing the raw matrix on every query,
+    followed by a full `np.argsort`
+  - after: pre-normalized C-contiguous float32 / float16 matrix and
+    `np.argpartition` top-k (`BruteForceIndex`)
+
+Run from `back/`:
+    python -m benchmarks.bench_similarity [--dim 768] [--queries 50]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.embedding import compute_similarity
+from src.index import BruteForceIndex
+
+SIZES = [1_000, 10_000, 100_000]
+TOP_K = 5
+
+
+def legacy_search(var_embedding, ref_embeddings, top_k=TOP_K):
+    scores = compute_similarity(var_embedding, ref_embeddings)
+    return np.argsort(-scores)[:top_k]
+
+
+def measure(search, queries):
+    """Return (mean latency in ms, peak temporary allocation in MB) per query."""
+    search(queries[0])  # warm-up
+    start = time.perf_counter()
+    for q in queries:
+        search(q)
+    latency = (time.perf_counter() - start) / len(queries) * 1e3
+
+    tracemalloc.start()
+    search(queries[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latency, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'size':>8} {'variant':<18} {'matrix MB':>10} {'query ms':>9} {'peak MB':>8}")
+    for n in args.sizes:
+        # Raw model output is float64 once converted by np.asarray(list)
+        raw = rng.normal(size=(n, args.dim))
+        queries = rng.normal(size=(args.queries, args.dim))
+
+        variants = [("before (float64)", raw.nbytes, lambda q: legacy_search(q, raw))]
+        expected = [set(legacy_search(q, raw)) for q in queries]
+        for dtype in (np.float32, np.float16):
+            index = BruteForceIndex(raw, dtype=dtype)
+            name = f"after ({np.dtype(dtype).name})"
+            variants.append((name, index.vectors.nbytes, lambda q, index=index: index.search(q, TOP_K)[1][0]))
+            recall = np.mean([len(e & set(index.search(q, TOP_K)[1][0])) / TOP_K for e, q in zip(expected, queries)])
+            if recall < 1.0:
+                print(f"{n:>8} {name:<18} top-{TOP_K} overlap with float64: {recall:.3f}")
+
+        for name, nbytes, search in variants:
+            latency, peak = measure(search, queries)
+            print(f"{n:>8} {name:<18} {nbytes / 2**20:>10.1f} {latency:>9.3f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Check that every PDF conversion path gives the same page markdown.
+
+For every PDF in `data/raw/pdf` (or the ones given), converts the document:
+  - whole document (`convert_pages`, the sequential `extract_pdf_pages`)
+  - by blocks of pages (`iter_pdf_pages`, 8 pages and 1 page per block)
+  - by blocks in a process pool (`iter_pdf_pages(max_workers=2)`)
+  - through the page cache, on a miss then on a hit (`iter_pdf_pages_cached`,
+    in a temporary cache file), and resumed from a partial entry (first
+    pages read, generator abandoned, then the whole document)
+
+and compares each result with the whole-document markdown, page by page: same
+page numbers, each produced once, same text. Exits with status 1 on any
+difference. Slow (several full conversions per PDF): pass one PDF to check
+a change quickly.
+
+Run from `back/`:
+    python -m benchmarks.check_pdf_pages [data/raw/pdf/FILE.pdf ...]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from src.extracting.page_cache import PageCache, iter_pdf_pages_cached
+from src.extracting.pdf_to_text import convert_pages, iter_pdf_pages
+
+PDF_DIR = Path(__file__).resolve().parent.parent / "data" / "raw" / "pdf"
+
+
+def as_pages(items):
+    """dict {page_num: markdown} of (page_num, markdown) pairs, refusing duplicates."""
+    pages = {}
+    for page_num, md in items:
+        if page_num in pages:
+            raise AssertionError(f"page {page_num} produced twice")
+        pages[page_num] = md
+    return pages
+
+
+def differences(expected, pages):
+    if sorted(pages) != sorted(expected):
+        return [f"pages {sorted(set(expected) ^ set(pages))} missing or extra"]
+    return [f"page {page_num} differs" for page_num in sorted(expected) if pages[page_num] != expected[page_num]]
+
+
+def resumed(pdf_bytes, cache, first_pages=3):
+    """Abandon the cached iteration after `first_pages`, then iterate again."""
+    pages = iter_pdf_pages_cached(pdf_bytes, cache=cache)
+    for _ in zip(range(first_pages), pages):
+        pass
+    pages.close()
+    return iter_pdf_pages_cached(pdf_bytes, cache=cache)
+
+
+def check_pdf(pdf_path):
+    pdf_bytes = Path(pdf_path).read_bytes()
+    start = time.perf_counter()
+    expected = convert_pages(pdf_bytes)
+    print(f"{Path(pdf_path).name}: {len(expected)} pages, whole document {time.perf_counter() - start:.1f}s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = PageCache(Path(tmp) / "pdf_pages.sqlite")
+        partial_cache = PageCache(Path(tmp) / "pdf_pages_partial.sqlite")
+        paths = {
+            "blocks of 8": lambda: iter_pdf_pages(pdf_bytes),
+            "blocks of 1": lambda: iter_pdf_pages(pdf_bytes, chunk_size=1),
+            "process pool": lambda: iter_pdf_pages(pdf_bytes, max_workers=2),
+            "cache miss": lambda: iter_pdf_pages_cached(pdf_bytes, cache=cache),
+            "cache hit": lambda: iter_pdf_pages_cached(pdf_bytes, cache=cache),
+            "cache resume": lambda: resumed(pdf_bytes, partial_cache),
+        }
+        failed = False
+        for name, convert in paths.items():
+            start = time.perf_counter()
+            try:
+                errors = differences(expected, as_pages(convert()))
+            except AssertionError as e:
+                errors = [str(e)]
+            status = "ok" if not errors else "; ".join(errors[:5]) + (f" (+{len(errors) - 5})" if len(errors) > 5 else "")
+            print(f"  {name:<13} {time.perf_counter() - start:>6.1f}s  {status}")
+            failed = failed or bool(errors)
+    return not failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdfs", nargs="*", help="PDF files (default: every PDF of data/raw/pdf)")
+    args = parser.parse_args()
+
+    pdfs = args.pdfs or sorted(PDF_DIR.glob("*.pdf"))
+    results = [check_pdf(pdf) for pdf in pdfs]
+    if not all(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
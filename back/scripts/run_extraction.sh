@@ -7,6 +7,8 @@ cd "$(dirname "$0")/.."
 EXCEL=$1
 PDF=$2
 OUTPUT=${3:-outputs/result.json}
+# Nombre de pages envoyées en parallèle au LLM
+WORKERS=${WORKERS:-1}
 
 if [ -z "$EXCEL" ] || [ -z "$PDF" ]; then
     echo "Usage: ./scripts/run_extraction.sh <excel> <pdf> [output]"
@@ -16,6 +18,7 @@ fi
 echo "Excel: $EXCEL"
 echo "PDF: $PDF"
 echo "Output: $OUTPUT"
+echo "Workers: $WORKERS"
 echo ""
 
-uv run python -m src.extracting.main "$EXCEL" "$PDF" "$OUTPUT"
\ No newline at end of file
+uv run python -m src.extracting.main "$EXCEL" "$PDF" "$OUTPUT" --workers "$WORKERS"
\ No newline at end of file
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -24,6 +24,11 @@ class AlignmentLLMResponse(BaseModel):
     why_description: str = Field(..., description="Description of why the alignment was made")
 class AlignmentLLMResponseList(BaseModel):
     items: List[AlignmentLLMResponse]
+class VariableAlignmentLLMResponse(BaseModel):
+    variable_key: str = Field(..., description="Key of the aligned variable in the batch prompt")
+    items: List[AlignmentLLMResponse]
+class BatchAlignmentLLMResponse(BaseModel):
+    variables: List[VariableAlignmentLLMResponse]
 class NormalizedVariable(BaseModel):
     dataset_id: str = Field(..., description="ID du dataset")
     trait_id: str = Field(..., description="ID du trait")
@@ -44,4 +49,13 @@ class ReferenceConcept(BaseModel):
 
 class AlignmentScore(BaseModel):
     ref_id: str = Field(..., description="Core variable id")
-    score: float = Field(..., description="Semantic proximity")
\ No newline at end of file
+    score: float = Field(..., description="Semantic proximity")
+
+
+class VariableAlignment(BaseModel):
+    dataset_id: str = Field(..., description="Dataset ID")
+    trait_id: str = Field(..., description="Trait ID")
+    candidates: List[AlignmentScore] = Field(default_factory=list, description="Top-k referential candidates")
+    alignments: Optional[AlignmentLLMResponseList] = Field(None, description="LLM alignments")
+    shortcut: Optional[str] = Field(None, description="Rule that aligned the variable without the LLM, if any")
+    error: Optional[str] = Field(None, description="Alignment error, if any")
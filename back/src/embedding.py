@@ -1,12 +1,24 @@
+import hashlib
+import os
+import threading
 import lmstudio as lms
 from pathlib import Path
-from typing import List, Union, Tuple
+from typing import List, Optional, Union, Tuple
 import numpy as np
 import pandas as pd
 
+from src.cache import CACHE_DIR
 from src.classes import ReferenceConcept, NormalizedVariable, AlignmentScore
+from src.index import build_index, normalize_rows, top_k_indices
+from src.lexical import LexicalIndex, build_dataset_lexical_string, reciprocal_rank_fusion
+from src.query_cache import QueryEmbeddingCache, get_query_cache
 
 
+# On-disk cache of referential embeddings, one sub-directory per model
+DEFAULT_EMBEDDING_CACHE_DIR = CACHE_DIR / "embeddings"
+# Hybrid retrieval: candidates taken from each ranking before fusion
+HYBRID_DEPTH = 50
+
 
 
 
@@ -18,6 +30,18 @@ def load_embedding_model(model_name:str = "nomic-embed-text-v1.5"):
     except Exception as e:
         print(f"Error while loading the embedding model: {e}")
         raise 
+
+
+_embedding_models = {}
+_embedding_models_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = "nomic-embed-text-v1.5"):
+    """Embedding model shared by the whole process, loaded on first call."""
+    with _embedding_models_lock:
+        if model_name not in _embedding_models:
+            _embedding_models[model_name] = load_embedding_model(model_name=model_name)
+        return _embedding_models[model_name]
     
 
 # def build_referential_embedding_string(entry: dict) -> str:
@@ -274,9 +298,12 @@ def save_referential_embedding(
         ref_embeddings_path = save_dir / embeddings_filename
         ref_ids_path = save_dir / ids_filename
 
-        # Save (aligned order preserved)
-        np.save(ref_embeddings_path, ref_embeddings)
-        np.save(ref_ids_path, np.array(ref_ids, dtype=object))
+        save_dir.mkdir(parents=True, exist_ok=True)
+
+        # Save (aligned order preserved). Files are written next to their
+        # target then renamed, so a reader never sees a half-written array.
+        _atomic_save(ref_embeddings_path, np.asarray(ref_embeddings))
+        _atomic_save(ref_ids_path, np.asarray(ref_ids, dtype=str))
 
         print(f"Referential embeddings saved to: {ref_embeddings_path}")
         print(f"Referential IDs saved to: {ref_ids_path}")
@@ -291,8 +318,15 @@ def save_referential_embedding(
 def load_referential_embedding(
     dir: Union[str, Path] = ".",
     embeddings_filename: str = "ref_embeddings.npy",
-    ids_filename: str = "ref_ids.npy"
+    ids_filename: str = "ref_ids.npy",
+    mmap_mode: Optional[str] = None,
     ):
+    """
+    Load referential embeddings saved by `save_referential_embedding`.
+
+    `mmap_mode` is forwarded to `np.load` for the embedding matrix, so that
+    `mmap_mode="r"` maps the file instead of reading it entirely.
+    """
     try:
       # Resolve directory
       save_dir = Path(dir).resolve()
@@ -301,8 +335,8 @@ def load_referential_embedding(
       ref_embeddings_path = save_dir / embeddings_filename
       ref_ids_path = save_dir / ids_filename
 
-      # Save (aligned order preserved)
-      ref_embeddings = np.load(ref_embeddings_path)
+      # Load (aligned order preserved)
+      ref_embeddings = np.load(ref_embeddings_path, mmap_mode=mmap_mode)
       ref_ids = np.load(ref_ids_path)
       return ref_ids, ref_embeddings
     except Exception as e:
@@ -310,6 +344,126 @@ def load_referential_embedding(
         raise
 
 
+def _atomic_save(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def referential_cache_key(text: str, model_name: str) -> str:
+    """
+    Content hash of a referential embedding string for a given model.
+
+    Two concepts rendering to the same `build_referential_embedding_string`
+    share the same key, and any change to the text or to the model yields a
+    new key.
+    """
+    return hashlib.sha256(f"{model_name}\n{text}".encode("utf-8")).hexdigest()
+
+
+def model_cache_dir(cache_dir: Union[str, Path], model_name: str) -> Path:
+    """Cache sub-directory of an embedding model."""
+    return Path(cache_dir) / model_name.replace("/", "__")
+
+
+def referential_fingerprint(ref_json: List[ReferenceConcept], model_name: str) -> str:
+    """Hash identifying a whole referential embedding (concepts, order and model)."""
+    digest = hashlib.sha256()
+    for r in ref_json:
+        digest.update(referential_cache_key(build_referential_embedding_string(r), model_name).encode("ascii"))
+    return digest.hexdigest()
+
+
+def build_cached_referential_embedding(
+    model,
+    ref_json: List[ReferenceConcept],
+    model_name: str,
+    cache_dir: Union[str, Path] = DEFAULT_EMBEDDING_CACHE_DIR,
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Same as `build_referential_embedding`, backed by an on-disk cache.
+
+    Every concept is keyed by `referential_cache_key` of its embedding
+    string. Concepts whose key is already cached are read from a
+    memory-mapped `.npy`; only new or changed concepts are sent to the
+    model. The cache is then rewritten in the referential order, so the
+    next start with an unchanged referential is a pure memory-map.
+
+    Parameters
+    ----------
+    model : EmbeddingModel
+        Model implementing an `embed(texts: Sequence[str])` method.
+    ref_json : Sequence[ReferenceConcept]
+        Referential entries used to generate embeddings.
+    model_name : str
+        Name of the embedding model, part of the cache key.
+    cache_dir : str | Path
+        Root cache directory. Each model gets its own sub-directory.
+
+    Returns
+    -------
+    Tuple[List[str], np.ndarray]
+        - ref_ids: List of stable referential IDs (length N)
+        - ref_embeddings: Embedding matrix of shape (N, D)
+    """
+    ref_texts: List[str] = [build_referential_embedding_string(r) for r in ref_json]
+    ref_ids: List[str] = [(entry.ref_id or entry.name).strip() for entry in ref_json]
+
+    if any(not rid for rid in ref_ids):
+        raise ValueError(
+            "Some referential entries are missing both 'ref_id' and 'name'."
+        )
+
+    keys = [referential_cache_key(text, model_name) for text in ref_texts]
+    model_dir = model_cache_dir(cache_dir, model_name)
+
+    # Read the cache (if any); a corrupt cache is treated as empty
+    cached_keys: List[str] = []
+    cached_embeddings = None
+    if (model_dir / "ref_embeddings.npy").exists() and (model_dir / "ref_ids.npy").exists():
+        try:
+            cached_ids, cached_embeddings = load_referential_embedding(model_dir, mmap_mode="r")
+            cached_keys = [str(k) for k in cached_ids]
+            if cached_embeddings.ndim != 2 or len(cached_keys) != len(cached_embeddings):
+                cached_keys, cached_embeddings = [], None
+        except Exception:
+            cached_keys, cached_embeddings = [], None
+
+    # Unchanged referential: serve the memory-mapped matrix directly
+    if cached_embeddings is not None and cached_keys == keys:
+        print(f"Referential embeddings loaded from cache ({len(keys)} concepts)")
+        return ref_ids, cached_embeddings
+
+    key_to_row = {k: i for i, k in enumerate(cached_keys)}
+    missing = [i for i, k in enumerate(keys) if k not in key_to_row]
+    print(f"Referential embeddings: {len(keys) - len(missing)} cached, {len(missing)} to embed")
+
+    new_embeddings = None
+    if missing:
+        new_embeddings = np.asarray(model.embed([ref_texts[i] for i in missing]), dtype=np.float32)
+        if len(new_embeddings) != len(missing):
+            raise ValueError(
+                "ref_embeddings and ref_ids must have the same length."
+            )
+        # Model output changed shape: the cached rows cannot be reused
+        if cached_embeddings is not None and cached_embeddings.shape[1] != new_embeddings.shape[1]:
+            key_to_row = {}
+            missing = list(range(len(keys)))
+            new_embeddings = np.asarray(model.embed(ref_texts), dtype=np.float32)
+
+    dim = new_embeddings.shape[1] if new_embeddings is not None else cached_embeddings.shape[1]
+    ref_embeddings = np.empty((len(keys), dim), dtype=np.float32)
+    if missing:
+        ref_embeddings[missing] = new_embeddings
+    hits = [i for i, k in enumerate(keys) if k in key_to_row]
+    if hits:
+        ref_embeddings[hits] = cached_embeddings[[key_to_row[keys[i]] for i in hits]]
+
+    save_referential_embedding(ref_embeddings, keys, dir=model_dir)
+    return ref_ids, ref_embeddings
+
+
 def build_var_embedding(model, norm_var: NormalizedVariable)-> np.array:
     try:
         embedding_str = build_dataset_embedding_string(norm_var)
@@ -319,6 +473,34 @@ def build_var_embedding(model, norm_var: NormalizedVariable)-> np.array:
         raise
 
 
+def build_var_embeddings(
+    model,
+    norm_vars: List[NormalizedVariable],
+    model_name: Optional[str] = None,
+    cache: Optional[QueryEmbeddingCache] = None,
+) -> np.ndarray:
+    """
+    Embed several variables with a single `model.embed` call.
+
+    With a `cache` (and the `model_name` it is keyed by), variables whose
+    embedding string is cached are not sent to the model: only the misses
+    are embedded, still in a single call.
+
+    Returns
+    -------
+    np.ndarray
+        Embedding matrix of shape (M, D), rows aligned with `norm_vars`.
+    """
+    try:
+        embedding_strs = [build_dataset_embedding_string(v) for v in norm_vars]
+        if cache is not None:
+            return cache.embed(model, model_name, embedding_strs)
+        return np.asarray(model.embed(embedding_strs))
+    except Exception as e:
+        print(f"Error while embedding the variables content: {e}")
+        raise
+
+
 def get_semantic_similarity_score(var_embedding, refs_embedding) -> List[float]:
     try:
         return refs_embedding @ var_embedding
@@ -339,8 +521,6 @@ def compute_similarity(
         Shape (d,)
     ref_embeddings : np.ndarray
         Shape (n, d)
-    top_k : Optional[int]
-        If provided, return only the top_k most similar embeddings.
 
     Returns
     -------
@@ -372,29 +552,146 @@ def compute_similarity(
       raise
 
 
-
-    
 def select_k_best_match(ref_ids: List[str], similarity_scores: np.ndarray, top_k:int = 5) -> Tuple[List[AlignmentScore], List[int]]:
   try:
-    # Sort descending
-    idx = np.argsort(-similarity_scores)
-    if top_k is not None:
-        res = []
-        for i in idx[:top_k]:
-            res.append({"ref_id": ref_ids[i],"scores": similarity_scores[i]})
-    return res, idx[:top_k]
+    # Partial selection of the top_k, then sort only those (descending)
+    if top_k is None:
+        top_k = len(similarity_scores)
+    idx = top_k_indices(similarity_scores, top_k)
+    res = []
+    for i in idx:
+        res.append({"ref_id": ref_ids[i],"scores": similarity_scores[i]})
+    return res, idx
   except Exception as e:
     print(f"Error while selection best matches with referential: {e}")
 
 
 class SemanticEmbedding:
-    def __init__(self, referential_json: List[ReferenceConcept], model_name:str = "nomic-embed-text-v1.5"):
-      self.model = load_embedding_model(model_name=model_name)
+    """
+    Referential embeddings and the similarity index used to retrieve candidates.
+
+    `ref_embeddings` are L2-normalized once at load time and stored as a
+    C-contiguous `dtype` array (float32, or float16 to halve memory; float16
+    is scored block by block and is slower per query, see
+    `benchmarks/bench_similarity.py`).
+
+    `index` selects the retrieval backend: "flat" (exact brute force) or
+    "ivf" (approximate, see `src.index.IVFIndex`). `index_params` are
+    forwarded to the index, e.g. `{"n_probe": 4}` to trade recall for
+    latency. When caching is enabled, the index is persisted next to the
+    embedding cache and reused as long as the referential is unchanged.
+
+    `retrieval` is "dense" (cosine similarity only) or "hybrid": the dense
+    ranking is fused by reciprocal rank fusion with a BM25 ranking over
+    character n-grams of concept names, aliases, units and methods (see
+    `src.lexical`), which finds cryptic trait ids such as `BER_MAL_g`.
+    Fusion only selects the `top_k` candidates: returned scores are cosine
+    similarities and candidates are ordered by score in both modes.
+
+    Query embeddings go through `query_cache` (the process-wide
+    `get_query_cache()` by default): re-aligning a variable with the same
+    embedding string does not call the model again.
+
+    `model` reuses an already loaded embedding model (see
+    `with_referential`).
+    """
+
+    def __init__(
+        self,
+        referential_json: List[ReferenceConcept],
+        model_name:str = "nomic-embed-text-v1.5",
+        cache_dir: Optional[Union[str, Path]] = DEFAULT_EMBEDDING_CACHE_DIR,
+        index: str = "flat",
+        index_params: Optional[dict] = None,
+        dtype=np.float32,
+        retrieval: str = "dense",
+        model=None,
+        query_cache: Optional[QueryEmbeddingCache] = None,
+    ):
+      if retrieval not in ("dense", "hybrid"):
+          raise ValueError(f"Unknown retrieval mode: {retrieval!r} (expected 'dense' or 'hybrid')")
+      self.model_name = model_name
+      self.retrieval = retrieval
+      self.query_cache = query_cache if query_cache is not None else get_query_cache()
+      self.cache_dir = cache_dir
+      self.index_kind = index
+      self.index_params = index_params
+      self.dtype = dtype
+      self.model = model if model is not None else load_embedding_model(model_name=model_name)
       print("this is my model", self.model)
-      self.ref_ids, self.ref_embeddings = build_referential_embedding(self.model, referential_json)   
+      if cache_dir is None:
+          self.ref_ids, self.ref_embeddings = build_referential_embedding(self.model, referential_json)
+          index_dir = None
+      else:
+          self.ref_ids, self.ref_embeddings = build_cached_referential_embedding(
+              self.model, referential_json, model_name, cache_dir=cache_dir
+          )
+          index_dir = model_cache_dir(cache_dir, model_name)
+      # Normalize once; the index shares this matrix instead of copying it
+      self.ref_embeddings = normalize_rows(self.ref_embeddings, dtype=dtype)
+      self.index = build_index(
+          self.ref_embeddings,
+          kind=index,
+          dir=index_dir,
+          fingerprint=referential_fingerprint(referential_json, model_name),
+          dtype=dtype,
+          normalized=True,
+          **(index_params or {}),
+      )
+      self.lexical_index = LexicalIndex(referential_json) if retrieval == "hybrid" else None
+
+    def with_referential(self, referential_json: List[ReferenceConcept]) -> "SemanticEmbedding":
+      """
+      New `SemanticEmbedding` over another version of the referential.
+
+      Same model, cache and index settings. With the embedding cache, only
+      concepts whose embedding string changed are sent to the model. `self`
+      is left untouched, so searches running on it stay consistent.
+      """
+      return SemanticEmbedding(
+          referential_json,
+          model_name=self.model_name,
+          cache_dir=self.cache_dir,
+          index=self.index_kind,
+          index_params=self.index_params,
+          dtype=self.dtype,
+          retrieval=self.retrieval,
+          model=self.model,
+          query_cache=self.query_cache,
+      )
+
+    def _format_matches(self, scores: np.ndarray, idx: np.ndarray) -> Tuple[List[AlignmentScore], List[int]]:
+      # Same layout as `select_k_best_match`; drop padding of approximate searches
+      keep = idx >= 0
+      scores, idx = scores[keep], idx[keep]
+      res = [{"ref_id": self.ref_ids[i], "scores": s} for s, i in zip(scores, idx)]
+      return res, idx
+
+    def _search(self, var_jsons: List[NormalizedVariable], var_embeddings: np.ndarray, top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+      if self.lexical_index is None:
+          scores, idx = self.index.search(var_embeddings, top_k=top_k)
+          return list(zip(scores, idx))
+      depth = max(top_k, HYBRID_DEPTH)
+      _, dense_idx = self.index.search(var_embeddings, top_k=depth)
+      _, lexical_idx = self.lexical_index.search([build_dataset_lexical_string(v) for v in var_jsons], top_k=depth)
+      queries = normalize_rows(np.atleast_2d(np.asarray(var_embeddings, dtype=np.float32)))
+      results = []
+      for query, dense, lexical in zip(queries, dense_idx, lexical_idx):
+          idx = reciprocal_rank_fusion([dense, lexical], top_k=top_k)
+          scores = np.asarray(self.ref_embeddings[idx], dtype=np.float32) @ query
+          # Same order as the scores, for consumers that rank by score
+          order = np.argsort(-scores, kind="stable")
+          results.append((scores[order], idx[order]))
+      return results
 
     def get_best_matches(self, var_json: NormalizedVariable, top_k:int = 5) -> List[AlignmentScore]:   
-      var_embedding = build_var_embedding(self.model, var_json)
-      similarity_scores = compute_similarity(var_embedding, self.ref_embeddings)
-      return select_k_best_match(self.ref_ids, similarity_scores, top_k= top_k)
-
+      var_embedding = build_var_embeddings(self.model, [var_json], self.model_name, self.query_cache)
+      scores, idx = self._search([var_json], var_embedding, top_k)[0]
+      return self._format_matches(scores, idx)
+
+    def get_best_matches_batch(self, var_jsons: List[NormalizedVariable], top_k:int = 5) -> List[Tuple[List[AlignmentScore], List[int]]]:
+      """Batched `get_best_matches`: one embedding call and one matrix multiply."""
+      if not var_jsons:
+          return []
+      var_embeddings = build_var_embeddings(self.model, var_jsons, self.model_name, self.query_cache)
+      return [self._format_matches(s, i) for s, i in self._search(var_jsons, var_embeddings, top_k)]
@@ -0,0 +1,111 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+class CapacityError(RuntimeError):
+    """Raised when a `BoundedExecutor` or `AdmissionGate` already holds as many tasks as it accepts."""
+
+
+class AdmissionGate:
+    """
+    Admission control without an executor.
+
+    At most `capacity` holders at once; `acquire` raises `CapacityError`
+    right away when they are all taken, instead of waiting.
+    """
+
+    def __init__(self, name: str, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self._slots = threading.BoundedSemaphore(capacity)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self._slots.acquire(blocking=False):
+            raise CapacityError(f"{self.name} is at capacity ({self.capacity} tasks)")
+        with self._lock:
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "in_flight": self.in_flight}
+
+
+class BoundedExecutor:
+    """
+    Executor wrapper with admission control.
+
+    At most `max_workers` tasks run at once and at most `max_queue` more
+    wait for a worker; beyond that `submit` raises `CapacityError` right
+    away instead of growing an unbounded queue.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_workers: int, max_queue: int = 0):
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._gate = AdmissionGate(f"{name} executor", max_workers + max_queue)
+
+    @classmethod
+    def threads(cls, name: str, max_workers: int, max_queue: int = 0) -> "BoundedExecutor":
+        """Thread pool, for I/O-bound work (LLM and embedding calls)."""
+        return cls(name, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name), max_workers, max_queue)
+
+    @classmethod
+    def processes(cls, name: str, max_workers: int, max_queue: int = 0) -> "BoundedExecutor":
+        """
+        Process pool, for CPU-bound work (PDF layout analysis).
+
+        Workers are spawned, not forked: the parent runs threads and holds
+        locks and open SQLite connections (caches) that a fork would copy
+        in whatever state they are.
+        """
+        context = multiprocessing.get_context("spawn")
+        return cls(name, ProcessPoolExecutor(max_workers=max_workers, mp_context=context), max_workers, max_queue)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        self._gate.acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._gate.release()
+            raise
+        future.add_done_callback(lambda _: self._gate.release())
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Submit `fn` and await its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._gate.in_flight,
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
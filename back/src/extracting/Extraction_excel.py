@@ -33,7 +33,8 @@ def extract_traits(excel_path, sheet_name="Plots notations"):
             "description": str(description).strip()
         })
 
-    print(f"Fichier : {os.path.basename(excel_path)}")
+    name = os.path.basename(excel_path) if isinstance(excel_path, (str, os.PathLike)) else "<upload>"
+    print(f"Fichier : {name}")
     print(f"   Traits extraits ({len(traits)}) :")
     for t in traits:
         print(f"     - {t['trait_id']:30s} → {t['description']}")
@@ -0,0 +1,109 @@
+import os
+from typing import NamedTuple
+
+from src.tokens import estimate_tokens
+
+
+# Budget (tokens estimés) du contenu d'un prompt : le gabarit (~400 tokens) et
+# la réponse (MAX_TOKENS=2000) doivent tenir à côté dans la fenêtre du modèle
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "3000"))
+# Recouvrement entre les fenêtres d'une même page découpée
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "200"))
+
+
+class Chunk(NamedTuple):
+    """
+    Unité envoyée au LLM : les pages first_page..last_page regroupées, ou la
+    partie `part`/`parts` d'une page trop longue (first_page == last_page).
+    """
+    first_page: int
+    last_page: int
+    part: int = 1
+    parts: int = 1
+
+    def __str__(self):
+        label = str(self.first_page) if self.first_page == self.last_page else f"{self.first_page}-{self.last_page}"
+        return label if self.parts == 1 else f"{label} [{self.part}/{self.parts}]"
+
+
+def page_header(page_num):
+    return f"--- Page {page_num} ---\n"
+
+
+def split_page(content, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Découpe une page trop longue en fenêtres d'au plus `max_tokens`.
+
+    Les coupures tombent entre deux lignes (jamais au milieu d'une ligne de
+    tableau), et chaque fenêtre reprend les dernières lignes de la précédente
+    sur `overlap_tokens` : une mention à cheval sur une coupure est entière
+    dans l'une des deux fenêtres. Une ligne plus longue que le budget est
+    coupée par caractères.
+    """
+    lines = []
+    for line in content.splitlines(keepends=True):
+        tokens = estimate_tokens(line)
+        if tokens <= max_tokens:
+            lines.append((line, tokens))
+            continue
+        # Ligne géante : tranches de caractères proportionnelles au budget
+        step = max(1, len(line) * max_tokens // (tokens + 1))
+        lines.extend((line[i:i + step], estimate_tokens(line[i:i + step])) for i in range(0, len(line), step))
+
+    windows = []
+    window, size = [], 0
+    for line, tokens in lines:
+        if window and size + tokens > max_tokens:
+            windows.append("".join(text for text, _ in window))
+            # Recouvrement : on garde la fin de la fenêtre précédente
+            kept, kept_size = [], 0
+            for text, count in reversed(window):
+                if kept_size + count > overlap_tokens or kept_size + count + tokens > max_tokens:
+                    break
+                kept.insert(0, (text, count))
+                kept_size += count
+            window, size = kept, kept_size
+        window.append((line, tokens))
+        size += tokens
+    if window:
+        windows.append("".join(text for text, _ in window))
+    return windows
+
+
+def iter_chunks(pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Générateur (Chunk, content) à partir de (page_num, content), dans l'ordre.
+
+    Les pages consécutives sont regroupées tant que le total tient dans
+    `max_tokens` (chaque page précédée de son en-tête "--- Page N ---") ;
+    une page qui dépasse seule le budget est découpée par `split_page`.
+    Fonctionne en flux : au plus un groupe de pages est gardé en mémoire.
+    """
+    group, size = [], 0
+
+    def flush():
+        chunk = Chunk(group[0][0], group[-1][0])
+        return chunk, "\n".join(page_header(num) + text for num, text in group)
+
+    for page_num, content in pages:
+        tokens = estimate_tokens(page_header(page_num) + content)
+        if tokens > max_tokens:
+            if group:
+                yield flush()
+                group, size = [], 0
+            windows = split_page(content, max_tokens - estimate_tokens(page_header(page_num)), overlap_tokens)
+            for part, window in enumerate(windows, start=1):
+                yield Chunk(page_num, page_num, part, len(windows)), page_header(page_num) + window
+            continue
+        if group and size + tokens > max_tokens:
+            yield flush()
+            group, size = [], 0
+        group.append((page_num, content))
+        size += tokens
+    if group:
+        yield flush()
+
+
+def chunk_pages(pages, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """Version dict de `iter_chunks` : {page_num: content} → {Chunk: content}."""
+    return dict(iter_chunks(sorted(pages.items()), max_tokens, overlap_tokens))
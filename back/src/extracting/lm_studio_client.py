@@ -1,32 +1,213 @@
+import asyncio
+import os
+import threading
+import weakref
+
+import httpx
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def query_lm_studio_with_text(prompt: str) -> str:
-    """
-    Envoie un prompt texte seul au LLM (sans image).
-    
-    Args:
-        prompt: Le prompt textuel à envoyer
-        
-    Returns:
-        La réponse du LLM en texte brut
-    """
-    url = "http://localhost:1234/v1/chat/completions"
-    
-    payload = {
-        "model": "openai/gpt-oss-20b",
+from src.llm_cache import get_llm_cache, llm_cache_key
+
+LM_STUDIO_URL = os.environ.get("LM_STUDIO_URL", "http://localhost:1234/v1/chat/completions")
+MODEL = "openai/gpt-oss-20b"
+TEMPERATURE = 0.1
+MAX_TOKENS = 2000
+
+# Timeouts (secondes) : connexion courte, lecture longue (génération LLM)
+CONNECT_TIMEOUT = float(os.environ.get("LM_STUDIO_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("LM_STUDIO_READ_TIMEOUT", "300"))
+MAX_RETRIES = int(os.environ.get("LM_STUDIO_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 16
+
+# Codes HTTP pour lesquels on retente la requête
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def build_payload(prompt: str, model: str = MODEL) -> dict:
+    return {
+        "model": model,
         "messages": [
             {
                 "role": "user",
                 "content": prompt
             }
         ],
-        "temperature": 0.1,
-        "max_tokens": 2000
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
     }
-    
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
-    
-    result = response.json()
-    return result["choices"][0]["message"]["content"]
\ No newline at end of file
+
+
+def cache_key(prompt: str, model: str = MODEL) -> str:
+    return llm_cache_key(model, prompt, TEMPERATURE, params={"max_tokens": MAX_TOKENS})
+
+
+class LMStudioClient:
+    """
+    Client HTTP synchrone pour LM Studio.
+
+    Une `requests.Session` partagée garde les connexions ouvertes
+    (keep-alive, pool de `pool_size` connexions) ; timeouts et retries avec
+    backoff exponentiel sont configurables. Utilisable depuis plusieurs
+    threads.
+    """
+
+    def __init__(
+        self,
+        url: str = LM_STUDIO_URL,
+        model: str = MODEL,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_factor: float = BACKOFF_FACTOR,
+        pool_size: int = POOL_SIZE,
+    ):
+        self.url = url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=None,  # POST inclus : la complétion est sans effet de bord
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def complete(self, prompt: str, use_cache: bool = True) -> str:
+        """Envoie le prompt et retourne la réponse texte (via le cache si possible)."""
+        def call():
+            response = self.session.post(self.url, json=build_payload(prompt, self.model), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()["choices"][0]["message"]["content"]
+
+        if not use_cache:
+            return call()
+        return get_llm_cache().get_or_call(
+            call, model=self.model, prompt=prompt, temperature=TEMPERATURE, params={"max_tokens": MAX_TOKENS}
+        )
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncLMStudioClient:
+    """
+    Variante asyncio de `LMStudioClient`, basée sur `httpx.AsyncClient`.
+
+    À utiliser depuis une boucle d'événements (FastAPI, pipeline async) :
+    aucun appel ne bloque la boucle. Les lectures/écritures du cache SQLite
+    sont déportées dans un thread.
+    """
+
+    def __init__(
+        self,
+        url: str = LM_STUDIO_URL,
+        model: str = MODEL,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        max_retries: int = MAX_RETRIES,
+        backoff_factor: float = BACKOFF_FACTOR,
+        pool_size: int = POOL_SIZE,
+    ):
+        self.url = url
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _post(self, prompt: str) -> str:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.post(self.url, json=build_payload(prompt, self.model))
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response.json()["choices"][0]["message"]["content"]
+            except httpx.TransportError:
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(self.backoff_factor * 2 ** attempt)
+
+    async def complete(self, prompt: str, use_cache: bool = True) -> str:
+        """Envoie le prompt et retourne la réponse texte (via le cache si possible)."""
+        if not use_cache:
+            return await self._post(prompt)
+        cache = get_llm_cache()
+        key = cache_key(prompt, self.model)
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+        content = await self._post(prompt)
+        await asyncio.to_thread(cache.set, key, content)
+        return content
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+# Clients asyncio par boucle d'événements
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client() -> LMStudioClient:
+    """Client partagé par tout le processus (un seul pool de connexions)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LMStudioClient()
+        return _client
+
+
+def get_async_client() -> AsyncLMStudioClient:
+    """
+    Client asyncio partagé par les requêtes de la boucle d'événements courante.
+
+    httpx lie ses connexions à la boucle qui les a ouvertes : un client (et
+    un pool de connexions) par boucle, oublié quand la boucle disparaît.
+    """
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = AsyncLMStudioClient()
+        return client
+
+
+async def aclose_async_client() -> None:
+    """Ferme le client asyncio de la boucle courante (arrêt du serveur)."""
+    with _client_lock:
+        client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def query_lm_studio_with_text(prompt: str, use_cache: bool = True) -> str:
+    """
+    Envoie un prompt texte seul au LLM (sans image).
+
+    Les réponses sont mises en cache (modèle, prompt, température) : un
+    prompt identique n'est pas renvoyé au LLM.
+
+    Args:
+        prompt: Le prompt textuel à envoyer
+        use_cache: Utiliser le cache des réponses LLM
+
+    Returns:
+        La réponse du LLM en texte brut
+    """
+    return get_client().complete(prompt, use_cache=use_cache)
+
+
+async def aquery_lm_studio_with_text(prompt: str, client: AsyncLMStudioClient, use_cache: bool = True) -> str:
+    """Version asyncio de `query_lm_studio_with_text`."""
+    return await client.complete(prompt, use_cache=use_cache)
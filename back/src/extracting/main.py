@@ -1,29 +1,60 @@
+import argparse
+import asyncio
 import json
-import sys
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Optional
 from src.extracting.Extraction_excel import extract_traits
-from src.extracting.lm_studio_client import query_lm_studio_with_text
-import pymupdf
-import pymupdf4llm
+from src.extracting.lm_studio_client import aquery_lm_studio_with_text, get_async_client, query_lm_studio_with_text
+from src.extracting.page_cache import get_page_cache, iter_pdf_pages_cached, pdf_cache_key, read_pdf_bytes
+from src.extracting.chunking import CHUNK_MAX_TOKENS, Chunk, chunk_pages, iter_chunks
+from src.extracting.prefilter import get_prefilter
+from src.extracting.pdf_to_text import extract_pdf_pages, iter_pdf_pages, pdf_page_count
+from src.tokens import estimate_tokens
 
 
-def extract_pdf_to_dict(pdf_source):
-    """Extrait le PDF en dict {page_num: content}. Accepte chemin ou bytes."""
-    if isinstance(pdf_source, (str, Path)):
-        doc = pymupdf.open(str(pdf_source))
-    else:
-        doc = pymupdf.open(stream=pdf_source, filetype="pdf")
+PROMPT_PATH = Path(__file__).parent.parent.parent / "prompts" / "v2" / "prompt_targeted_extraction.txt"
+
+# Nombre de pages envoyées en parallèle au LLM (1 = séquentiel)
+DEFAULT_MAX_WORKERS = 1
+
+# Traits recherchés par l'API (en attendant l'upload de l'Excel)
+DEFAULT_TRAITS = [
+    {"trait_id": "VIGOUR", "description": "VIGOUR"},
+    {"trait_id": "Shoot_Lenght", "description": "Shoot Lenght"},
+    {"trait_id": "Leaf_Area", "description": "Leaf Area"},
+    {"trait_id": "SPAD", "description": "SPAD"},
+    {"trait_id": "Fresh_Aerial_Weight", "description": "Fresh Aerial Weight"},
+    {"trait_id": "Fresh_Root_Weight", "description": "Fresh Root Weight"},
+    {"trait_id": "Bud_Break", "description": "Bud Break"},
+]
 
-    pages = {}
-    for page_num in range(len(doc)):
-        page_md = pymupdf4llm.to_markdown(doc, pages=[page_num])
-        pages[page_num + 1] = page_md
 
-    doc.close()
+def extract_pdf_to_dict(pdf_source, max_workers=1, use_cache=True):
+    """Extrait le PDF en dict {page_num: content}. Accepte chemin ou bytes."""
+    if not use_cache:
+        return extract_pdf_pages(pdf_source, max_workers=max_workers)
+
+    pdf_bytes = read_pdf_bytes(pdf_source)
+    key = pdf_cache_key(pdf_bytes)
+    cache = get_page_cache()
+    pages = cache.get(key)
+    if pages is None:
+        pages = extract_pdf_pages(pdf_bytes, max_workers=max_workers)
+        cache.put(key, pages)
     return pages
 
 
+def iter_pages(pdf_source, pdf_workers=1, use_cache=True):
+    """Pages (page_num, content) au fil de la conversion, via le cache si possible."""
+    if use_cache:
+        return iter_pdf_pages_cached(pdf_source, max_workers=pdf_workers)
+    return iter_pdf_pages(pdf_source, max_workers=pdf_workers)
+
+
 def build_prompt(traits, page_content, template):
     trait_list = "\n".join(f"- {t['trait_id']}: {t['description']}" for t in traits)
     return template.replace("{trait_list}", trait_list).replace("{page_content}", page_content)
@@ -51,70 +82,330 @@ def merge(results, new_items):
         if not tid or tid not in results:
             continue
 
-        for field in ("trait", "method", "unit"):
-            if results[tid].get(field) in (None, "", "null") and item.get(field) not in (None, "", "null"):
-                results[tid][field] = item.get(field)
-
-def parse_file(file):
-    traits = [
-        {
-        "trait_id": "VIGOUR",
-        "description": "VIGOUR"
-        },
-        {
-        "trait_id": "Shoot_Lenght",
-        "description": "Shoot Lenght"
-        },
-        {
-        "trait_id": "Leaf_Area",
-        "description": "Leaf Area"
-        },
-        {
-        "trait_id": "SPAD",
-        "description": "SPAD"
-        },
-        {
-        "trait_id": "Fresh_Aerial_Weight",
-        "description": "Fresh Aerial Weight"
-        },
-        {
-        "trait_id": "Fresh_Root_Weight",
-        "description": "Fresh Root Weight"
-        },
-        {
-        "trait_id": "Bud_Break",
-        "description": "Bud Break"
-        }
-    ]
- 
-    pages = extract_pdf_to_dict(file)
-    prompt_path = Path(__file__).parent.parent.parent / "prompts" / "v2" / "prompt_targeted_extraction.txt"
+        for key in ("trait", "method", "unit"):
+            if results[tid].get(key) in (None, "", "null") and item.get(key) not in (None, "", "null"):
+                results[tid][key] = item.get(key)
+
+
+def load_template(prompt_path=PROMPT_PATH):
     with open(prompt_path, "r") as f:
-        template = f.read()
+        return f.read()
 
-    # 4. Initialiser résultats
-    results = {t["trait_id"]: {**t, "trait": None, "method": None, "unit": None} for t in traits}
 
-    # 5. Traiter chaque page
-    for page_num, content in pages.items():
-        print(f"Page {page_num}...", end=" ")
+def extract_page(traits, content, template):
+    """Envoie une page au LLM et retourne les items parsés."""
+    prompt = build_prompt(traits, content, template)
+    response = query_lm_studio_with_text(prompt)
+    return parse_json(response)
+
+
+def covered_pages(key):
+    """Pages terminées par une unité envoyée au LLM : 1 par page, ou celles d'un Chunk."""
+    if isinstance(key, Chunk):
+        return key.last_page - key.first_page + 1 if key.part == key.parts else 0
+    return 1
+
+
+def is_trait_complete(result):
+    """Un trait est complet quand trait, method et unit sont tous renseignés."""
+    return all(result.get(field) not in (None, "", "null") for field in ("trait", "method", "unit"))
+
+
+def missing_traits(traits, results):
+    """Traits encore incomplets, dans l'ordre de la liste."""
+    return [t for t in traits if not is_trait_complete(results[t["trait_id"]])]
+
+
+@dataclass
+class ExtractionStats:
+    """
+    Compteurs d'une extraction.
+
+    `tokens_saved` cumule les tokens retirés des prompts (traits déjà
+    complets), ceux des pages écartées par le pré-filtre lexical
+    (`pages_filtered`) et ceux des pages jamais envoyées après l'arrêt
+    anticipé (`pages_skipped`). Les tokens sont estimés par `estimate_tokens`.
+    Avec le découpage en chunks, `llm_calls` compte les appels et chaque
+    page est comptée une fois (à son dernier chunk).
+    """
+    total_pages: Optional[int] = None
+    llm_calls: int = 0
+    pages_sent: int = 0
+    pages_skipped: int = 0
+    pages_filtered: int = 0
+    prompt_tokens: int = 0
+    tokens_saved: int = 0
+    full_prompt_tokens: int = field(default=0, repr=False)
+
+    def sent(self, prompt, full_prompt, pages=1):
+        tokens = estimate_tokens(prompt)
+        full_tokens = estimate_tokens(full_prompt)
+        self.llm_calls += 1
+        self.pages_sent += pages
+        self.prompt_tokens += tokens
+        self.full_prompt_tokens += full_tokens
+        self.tokens_saved += full_tokens - tokens
+
+    def skipped(self, full_prompt, pages=1):
+        self.pages_skipped += pages
+        self.tokens_saved += estimate_tokens(full_prompt)
+
+    def skipped_unread(self):
+        """Pages jamais lues (source itérative) : tokens estimés sur la moyenne des pages envoyées."""
+        if self.total_pages is None:
+            return
+        unread = self.total_pages - self.pages_sent - self.pages_skipped - self.pages_filtered
+        if unread <= 0:
+            return
+        self.pages_skipped += unread
+        if self.pages_sent:
+            self.tokens_saved += unread * self.full_prompt_tokens // self.pages_sent
+
+    def summary(self):
+        total = self.total_pages if self.total_pages is not None else self.pages_sent + self.pages_skipped + self.pages_filtered
+        return (
+            f"Pages envoyées: {self.pages_sent}/{total} "
+            f"({self.pages_filtered} filtrées, {self.pages_skipped} évitées), appels LLM: {self.llm_calls}, "
+            f"tokens de prompt: {self.prompt_tokens} (~{self.tokens_saved} économisés)"
+        )
+
+
+def extract_traits_from_pages(
+    traits,
+    pages,
+    template,
+    max_workers=DEFAULT_MAX_WORKERS,
+    on_page=None,
+    early_stop=False,
+    stats=None,
+):
+    """
+    Interroge le LLM page par page et fusionne les résultats.
+
+    `pages` est un dict {page_num: content} ou un itérable de
+    (page_num, content) dans l'ordre des pages, par ex. `iter_pdf_pages` :
+    chaque page part au LLM dès qu'elle est convertie. Les clés peuvent
+    aussi être des `Chunk` (pages regroupées ou découpées, voir `iter_chunks`).
+
+    Avec early_stop (désactivé par défaut), chaque prompt ne liste que les traits encore
+    incomplets, et la lecture s'arrête dès que tous les traits sont
+    complets (les pages suivantes ne sont ni converties ni envoyées).
+
+    Avec max_workers > 1, jusqu'à max_workers pages sont envoyées en
+    parallèle, mais le merge est toujours fait dans l'ordre des pages et la
+    liste des traits d'une page ne dépend que des pages déjà fusionnées :
+    le résultat ne dépend pas de l'ordre d'arrivée des réponses.
+
+    `on_page(page_num, found, results)` est appelé après le merge de chaque
+    page (dans l'ordre), avec les trait_id trouvés sur la page. `stats`
+    (ExtractionStats) reçoit les compteurs de pages et de tokens.
+
+    Returns:
+        dict {trait_id: {trait_id, description, trait, method, unit}}
+    """
+    results = {t["trait_id"]: {**t, "trait": None, "method": None, "unit": None} for t in traits}
+    stats = stats if stats is not None else ExtractionStats()
+    materialized = isinstance(pages, dict)
+    if materialized:
+        if stats.total_pages is None:
+            stats.total_pages = sum(map(covered_pages, pages))
+        pages = sorted(pages.items())
+    pages = iter(pages)
+
+    def report(page_num, outcome):
+        found = []
         try:
-            prompt = build_prompt(traits, content, template)
-            response = query_lm_studio_with_text(prompt)
-            parsed = parse_json(response)
+            parsed = outcome()
             merge(results, parsed)
-
-            found = [item["trait_id"] for item in parsed]
-            print(f"{found if found else 'nothing'}")
+            found = [item.get("trait_id") for item in parsed]
+            print(f"Page {page_num}... {found if found else 'nothing'}")
         except Exception as e:
-            print(f"error: {e}")
+            print(f"Page {page_num}... error: {e}")
+        if on_page is not None:
+            on_page(page_num, found, results)
+
+    def next_traits(page_num, content):
+        """Traits à demander pour cette page ; [] si tout est complet."""
+        needed = missing_traits(traits, results) if early_stop else traits
+        if needed:
+            stats.sent(
+                build_prompt(needed, content, template),
+                build_prompt(traits, content, template),
+                covered_pages(page_num),
+            )
+        return needed
+
+    def stop(page_num, content):
+        print(f"Page {page_num}... tous les traits sont complets, arrêt")
+        stats.skipped(build_prompt(traits, content, template), covered_pages(page_num))
+        if materialized:
+            for rest_num, rest in pages:
+                stats.skipped(build_prompt(traits, rest, template), covered_pages(rest_num))
+        else:
+            stats.skipped_unread()
+
+    if max_workers <= 1:
+        for page_num, content in pages:
+            needed = next_traits(page_num, content)
+            if not needed:
+                stop(page_num, content)
+                break
+            report(page_num, lambda: extract_page(needed, content, template))
+        return results
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for page_num, content in pages:
+            needed = next_traits(page_num, content)
+            if not needed:
+                stop(page_num, content)
+                break
+            pending.append((page_num, pool.submit(extract_page, needed, content, template)))
+            # Fenêtre pleine : merge la plus ancienne page avant d'en lire une autre
+            if len(pending) >= max_workers:
+                done_num, future = pending.popleft()
+                report(done_num, future.result)
+        while pending:
+            page_num, future = pending.popleft()
+            report(page_num, future.result)
+
+    return results
+
+
+async def aextract_page(traits, content, template, client):
+    """Version asyncio de `extract_page`."""
+    prompt = build_prompt(traits, content, template)
+    response = await aquery_lm_studio_with_text(prompt, client)
+    return parse_json(response)
+
+
+async def astream_traits_from_pages(
+    traits,
+    pages,
+    template,
+    max_workers=DEFAULT_MAX_WORKERS,
+    client=None,
+    early_stop=False,
+    stats=None,
+):
+    """
+    Générateur asyncio : produit (page_num, found, results) après le merge de
+    chaque page, dans l'ordre des pages.
+
+    Jusqu'à `max_workers` pages sont en cours côté LLM et chaque page est
+    produite dès qu'elle et celles qui la précèdent ont répondu. `results`
+    est l'état fusionné courant (le même dict, mis à jour à chaque page).
+    `pages` est un dict {page_num: content}. `early_stop` et `stats` :
+    voir `extract_traits_from_pages`. Sans `client`, le client partagé de la
+    boucle courante est utilisé (`get_async_client`).
+    """
+    results = {t["trait_id"]: {**t, "trait": None, "method": None, "unit": None} for t in traits}
+    stats = stats if stats is not None else ExtractionStats()
+    if stats.total_pages is None:
+        stats.total_pages = sum(map(covered_pages, pages))
+    client = client or get_async_client()
+
+    page_nums = sorted(pages)
+    pending = deque()
+    next_index = 0
+
+    def fill():
+        # Complète la fenêtre, ou s'arrête si tous les traits sont complets
+        nonlocal next_index
+        while len(pending) < max(1, max_workers) and next_index < len(page_nums):
+            page_num = page_nums[next_index]
+            content = pages[page_num]
+            needed = missing_traits(traits, results) if early_stop else traits
+            if not needed:
+                print(f"Page {page_num}... tous les traits sont complets, arrêt")
+                for rest in page_nums[next_index:]:
+                    stats.skipped(build_prompt(traits, pages[rest], template), covered_pages(rest))
+                next_index = len(page_nums)
+                return
+            stats.sent(
+                build_prompt(needed, content, template),
+                build_prompt(traits, content, template),
+                covered_pages(page_num),
+            )
+            pending.append((page_num, asyncio.ensure_future(aextract_page(needed, content, template, client))))
+            next_index += 1
 
-    # 6. Sauvegarder
-    final = list(results.values())
-    return final
+    try:
+        fill()
+        while pending:
+            page_num, task = pending.popleft()
+            found = []
+            try:
+                parsed = await task
+                merge(results, parsed)
+                found = [item.get("trait_id") for item in parsed]
+                print(f"Page {page_num}... {found if found else 'nothing'}")
+            except Exception as e:
+                print(f"Page {page_num}... error: {e}")
+            fill()
+            yield page_num, found, results
+    finally:
+        # Client déconnecté / générateur fermé : on abandonne les pages restantes
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+
+async def aextract_traits_from_pages(
+    traits,
+    pages,
+    template,
+    max_workers=DEFAULT_MAX_WORKERS,
+    client=None,
+    early_stop=False,
+    stats=None,
+):
+    """
+    Version asyncio de `extract_traits_from_pages`, sans bloquer la boucle.
+
+    Au plus `max_workers` requêtes LLM simultanées ; merge dans l'ordre des
+    pages. `pages` est un dict {page_num: content}.
+    """
+    results = {t["trait_id"]: {**t, "trait": None, "method": None, "unit": None} for t in traits}
+    async for _, _, results in astream_traits_from_pages(
+        traits, pages, template, max_workers, client, early_stop=early_stop, stats=stats
+    ):
+        pass
+    return results
+
+
+def parse_file(file, max_workers=DEFAULT_MAX_WORKERS, pdf_workers=1, use_cache=True, early_stop=False, prefilter=False, chunk_tokens=None):
+    traits = DEFAULT_TRAITS
+    pages = iter_pages(file, pdf_workers=pdf_workers, use_cache=use_cache)
+    template = load_template()
+    stats = ExtractionStats(total_pages=pdf_page_count(file))
+    if prefilter:
+        pages = get_prefilter(traits).iter_filtered(pages, stats)
+    if chunk_tokens:
+        pages = iter_chunks(pages, max_tokens=chunk_tokens)
+
+    results = extract_traits_from_pages(traits, pages, template, max_workers=max_workers, early_stop=early_stop, stats=stats)
+    print(stats.summary())
+    return list(results.values())
+
+
+async def aparse_file(file, max_workers=DEFAULT_MAX_WORKERS, use_cache=True, early_stop=False, prefilter=False, chunk_tokens=None):
+    """Version asyncio de `parse_file`, pour les handlers FastAPI."""
+    pages = await asyncio.to_thread(extract_pdf_to_dict, file, 1, use_cache)
+    stats = ExtractionStats(total_pages=len(pages))
+    if prefilter:
+        page_filter = await asyncio.to_thread(get_prefilter, DEFAULT_TRAITS)
+        pages = page_filter.filter_pages(pages, stats)
+    if chunk_tokens:
+        pages = chunk_pages(pages, max_tokens=chunk_tokens)
+    results = await aextract_traits_from_pages(
+        DEFAULT_TRAITS, pages, load_template(), max_workers=max_workers, early_stop=early_stop, stats=stats
+    )
+    print(stats.summary())
+    return list(results.values())
 
     
-def run_pipeline(excel_source, pdf_source, output_path="outputs/result.json"):
+def run_pipeline(excel_source, pdf_source, output_path="outputs/result.json", max_workers=DEFAULT_MAX_WORKERS, pdf_workers=1, use_cache=True, early_stop=False, prefilter=False, chunk_tokens=None):
     """
     Lance la pipeline complète d'extraction.
 
@@ -122,6 +413,19 @@ def run_pipeline(excel_source, pdf_source, output_path="outputs/result.json"):
         excel_source : str | Path | bytes
         pdf_source   : str | Path | bytes
         output_path  : str
+        max_workers  : int, nombre de pages traitées en parallèle par le LLM
+        pdf_workers  : int, nombre de processus de conversion PDF → Markdown
+        use_cache    : bool, réutilise le Markdown d'un PDF déjà converti
+        early_stop   : bool, ne demande que les traits manquants et s'arrête
+                       quand tous sont complets
+        prefilter    : bool, n'envoie que les pages qui mentionnent un trait
+                       (et leurs voisines)
+        chunk_tokens : int, budget (tokens estimés) d'un prompt : les petites
+                       pages sont regroupées, les grandes découpées ; 0/None
+                       = une page par appel
+
+    early_stop, prefilter et chunk_tokens sont désactivés par défaut : le
+    résultat est alors celui de l'extraction page par page.
 
     Returns:
         list[dict]
@@ -130,32 +434,21 @@ def run_pipeline(excel_source, pdf_source, output_path="outputs/result.json"):
     traits = extract_traits(excel_source)
     print(f"Traits: {len(traits)}")
 
-    # 2. Extraire PDF
+    # 2. Extraire PDF (les pages sont produites au fil de la conversion)
     print(f"Extracting PDF...")
-    pages = extract_pdf_to_dict(pdf_source)
-    print(f"Pages: {len(pages)}\n")
+    pages = iter_pages(pdf_source, pdf_workers=pdf_workers, use_cache=use_cache)
+    stats = ExtractionStats(total_pages=pdf_page_count(pdf_source))
+    print(f"Pages: {stats.total_pages}\n")
+    if prefilter:
+        pages = get_prefilter(traits).iter_filtered(pages, stats)
+    if chunk_tokens:
+        pages = iter_chunks(pages, max_tokens=chunk_tokens)
 
     # 3. Charger prompt
-    prompt_path = Path(__file__).parent.parent.parent / "prompts" / "v2" / "prompt_targeted_extraction.txt"
-    with open(prompt_path, "r") as f:
-        template = f.read()
-
-    # 4. Initialiser résultats
-    results = {t["trait_id"]: {**t, "trait": None, "method": None, "unit": None} for t in traits}
-
-    # 5. Traiter chaque page
-    for page_num, content in pages.items():
-        print(f"Page {page_num}...", end=" ")
-        try:
-            prompt = build_prompt(traits, content, template)
-            response = query_lm_studio_with_text(prompt)
-            parsed = parse_json(response)
-            merge(results, parsed)
+    template = load_template()
 
-            found = [item["trait_id"] for item in parsed]
-            print(f"{found if found else 'nothing'}")
-        except Exception as e:
-            print(f"error: {e}")
+    # 4-5. Traiter chaque page
+    results = extract_traits_from_pages(traits, pages, template, max_workers=max_workers, early_stop=early_stop, stats=stats)
 
     # 6. Sauvegarder
     final = list(results.values())
@@ -165,16 +458,29 @@ def run_pipeline(excel_source, pdf_source, output_path="outputs/result.json"):
 
     complete = sum(1 for r in final if r["trait"])
     print(f"\nDone: {complete}/{len(traits)} traits found")
+    print(stats.summary())
     print(f"Saved: {output_path}")
 
     return final
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: python -m src.extracting.main <excel_path> <pdf_path> [output_path]")
-        sys.exit(1)
-
-    output = sys.argv[3] if len(sys.argv) > 3 else "outputs/result.json"
-    run_pipeline(sys.argv[1], sys.argv[2], output)
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(prog="python -m src.extracting.main")
+    parser.add_argument("excel_path")
+    parser.add_argument("pdf_path")
+    parser.add_argument("output_path", nargs="?", default="outputs/result.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="nombre de pages envoyées en parallèle au LLM")
+    parser.add_argument("--pdf-workers", type=int, default=1,
+                        help="nombre de processus de conversion PDF → Markdown")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore le cache du Markdown des pages")
+    parser.add_argument("--early-stop", action="store_true",
+                        help="ne demande que les traits manquants et s'arrête quand tous sont complets")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="n'envoie que les pages qui mentionnent un trait (et leurs voisines)")
+    parser.add_argument("--chunk-tokens", type=int, nargs="?", const=CHUNK_MAX_TOKENS, default=None,
+                        help=f"regroupe / découpe les pages en prompts de ce budget en tokens (sans valeur : {CHUNK_MAX_TOKENS} ; par défaut une page par appel)")
+    args = parser.parse_args()
+
+    run_pipeline(args.excel_path, args.pdf_path, args.output_path, max_workers=args.workers, pdf_workers=args.pdf_workers, use_cache=not args.no_cache, early_stop=args.early_stop, prefilter=args.prefilter, chunk_tokens=args.chunk_tokens)
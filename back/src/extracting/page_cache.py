@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+
+import pymupdf4llm
+
+from src.cache import CACHE_DIR, SQLiteCache
+from src.extracting.pdf_to_text import iter_pdf_pages, pdf_page_count
+
+
+PAGE_CACHE_PATH = CACHE_DIR / "pdf_pages.sqlite"
+# Taille max du cache (Mo), éviction LRU au-delà
+PAGE_CACHE_MAX_MB = int(os.environ.get("PAGE_CACHE_MAX_MB", "256"))
+
+# À incrémenter si la conversion PDF → Markdown change de format
+CONVERTER_VERSION = f"pymupdf4llm-{pymupdf4llm.__version__}/3"
+
+
+def read_pdf_bytes(pdf_source):
+    if isinstance(pdf_source, (str, Path)):
+        return Path(pdf_source).read_bytes()
+    return bytes(pdf_source)
+
+
+def pdf_cache_key(pdf_bytes):
+    """Clé de cache : SHA-256 du contenu du PDF + version du convertisseur."""
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()}:{CONVERTER_VERSION}"
+
+
+class PageCache:
+    """
+    Cache disque du Markdown des pages, adressé par le contenu du PDF.
+
+    Les pages d'un document sont stockées en une entrée SQLite (JSON
+    compressé zlib) avec le nombre de pages du document : une entrée peut
+    être partielle (conversion interrompue), `get` ne renvoie que les
+    entrées complètes. Éviction LRU quand la taille dépasse `max_bytes`.
+    """
+
+    def __init__(self, path=PAGE_CACHE_PATH, max_bytes=PAGE_CACHE_MAX_MB * 2**20):
+        self.store = SQLiteCache(path, max_bytes=max_bytes)
+
+    def get_entry(self, key):
+        """(pages, page_count) de l'entrée, éventuellement partielle, ou None."""
+        blob = self.store.get(key)
+        if blob is None:
+            return None
+        entry = json.loads(zlib.decompress(blob))
+        return {page_num: md for page_num, md in entry["pages"]}, entry["page_count"]
+
+    def get(self, key):
+        """Pages du document si elles sont toutes en cache, sinon None."""
+        entry = self.get_entry(key)
+        if entry is None or len(entry[0]) < entry[1]:
+            return None
+        return entry[0]
+
+    def put(self, key, pages, page_count=None):
+        """`page_count` : nombre de pages du document, si `pages` n'en est qu'une partie."""
+        entry = {"page_count": len(pages) if page_count is None else page_count, "pages": sorted(pages.items())}
+        payload = json.dumps(entry, ensure_ascii=False).encode("utf-8")
+        self.store.set(key, zlib.compress(payload, level=6))
+
+
+_page_cache = None
+_page_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    global _page_cache
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+        return _page_cache
+
+
+def iter_pdf_pages_cached(pdf_source, max_workers=1, cache=None):
+    """
+    Comme `iter_pdf_pages`, mais sans reconversion des pages en cache.
+
+    En cas de miss, les pages sont produites au fil de la conversion ; les
+    pages converties sont mises en cache quand le générateur se termine,
+    y compris s'il est abandonné en route (arrêt anticipé de l'extraction).
+    Une entrée partielle est complétée au passage suivant : seules les
+    pages manquantes sont converties.
+    """
+    cache = cache or get_page_cache()
+    pdf_bytes = read_pdf_bytes(pdf_source)
+    key = pdf_cache_key(pdf_bytes)
+
+    entry = cache.get_entry(key)
+    pages, page_count = entry if entry is not None else ({}, pdf_page_count(pdf_bytes))
+    if len(pages) == page_count:
+        print(f"PDF pages loaded from cache ({len(pages)} pages)")
+        yield from sorted(pages.items())
+        return
+    if pages:
+        print(f"PDF pages loaded from cache ({len(pages)}/{page_count} pages)")
+
+    cached = sorted(pages.items())
+    missing = [page_num for page_num in range(1, page_count + 1) if page_num not in pages]
+    stored = len(pages)
+    try:
+        for page_num, md in iter_pdf_pages(pdf_bytes, max_workers=max_workers, page_nums=missing):
+            # Pages en cache intercalées dans l'ordre du document
+            while cached and cached[0][0] < page_num:
+                yield cached.pop(0)
+            pages[page_num] = md
+            yield page_num, md
+        yield from cached
+    finally:
+        if len(pages) > stored:
+            cache.put(key, pages, page_count)
@@ -1,35 +1,114 @@
 import sys
 import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 import pymupdf
 import pymupdf4llm
 
 
+# Nombre de pages converties par tâche (mode itératif / pool de processus)
+DEFAULT_CHUNK_SIZE = 8
+
+
+def open_pdf(pdf_source):
+    """Ouvre un PDF depuis un chemin ou des bytes."""
+    if isinstance(pdf_source, (str, Path)):
+        return pymupdf.open(str(pdf_source))
+    return pymupdf.open(stream=pdf_source, filetype="pdf")
+
+
+def pdf_page_count(pdf_source):
+    with open_pdf(pdf_source) as doc:
+        return len(doc)
+
+
+def convert_page(doc, page_num):
+    """
+    Markdown d'une page (numéro 1-based) d'un document ouvert.
+
+    Une page par appel pymupdf4llm : le moteur de mise en page classe les
+    niveaux de titres d'après les pages converties ensemble (il ignore
+    `hdr_info`). Convertie seule, une page donne le même Markdown quel que
+    soit le découpage (document entier, blocs, pool de processus).
+    """
+    chunks = pymupdf4llm.to_markdown(doc, pages=[page_num - 1], page_chunks=True)
+    return chunks[0]["text"]
+
+
+def convert_pages(pdf_source, page_nums=None):
+    """
+    Convertit des pages en Markdown, le PDF n'étant ouvert qu'une fois.
+
+    Args:
+        pdf_source : str | Path | bytes
+        page_nums  : list[int] (numéros 1-based), toutes les pages si None
+
+    Returns:
+        dict {page_num: markdown}
+    """
+    with open_pdf(pdf_source) as doc:
+        if page_nums is None:
+            page_nums = list(range(1, len(doc) + 1))
+        return {page_num: convert_page(doc, page_num) for page_num in page_nums}
+
+
+def iter_pdf_pages(pdf_source, max_workers=1, chunk_size=DEFAULT_CHUNK_SIZE, page_nums=None):
+    """
+    Générateur (page_num, markdown), dans l'ordre des pages.
+
+    Les pages sont converties par blocs de `chunk_size` et produites dès
+    qu'un bloc est prêt : les appels LLM peuvent démarrer avant la fin de la
+    conversion. Avec max_workers > 1, les blocs sont convertis en parallèle
+    dans un pool de processus (la mise en page pymupdf4llm est CPU-bound).
+    `page_nums` (numéros 1-based, croissants) limite la conversion à ces
+    pages, toutes si None.
+    """
+    if page_nums is None:
+        page_nums = range(1, pdf_page_count(pdf_source) + 1)
+    # Blocs disjoints de `chunk_size` pages : chaque page est convertie une fois
+    blocks = [list(page_nums[i:i + chunk_size]) for i in range(0, len(page_nums), chunk_size)]
+
+    if max_workers <= 1:
+        for block in blocks:
+            yield from convert_pages(pdf_source, block).items()
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(convert_pages, pdf_source, block) for block in blocks]
+        for future in futures:
+            yield from future.result().items()
+
+
+def extract_pdf_pages(pdf_source, max_workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Extrait le PDF en dict {page_num: markdown}.
+
+    En séquentiel, tout le document est converti sur un seul PDF ouvert ;
+    sinon les pages sont réparties par blocs sur un pool de processus.
+    """
+    if max_workers <= 1:
+        return convert_pages(pdf_source)
+    return dict(iter_pdf_pages(pdf_source, max_workers=max_workers, chunk_size=chunk_size))
+
+
 def extract_pdf_to_json(pdf_path):
     """Extrait le PDF en JSON : {page_num: content}."""
-    doc = pymupdf.open(pdf_path)
-    pages = {}
-    
-    for page_num in range(len(doc)):
-        page_md = pymupdf4llm.to_markdown(doc, pages=[page_num])
-        pages[page_num + 1] = page_md
-    
-    doc.close()
-    return pages
+    return extract_pdf_pages(pdf_path)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python pdf_to_text.py <pdf_path> [output.json]")
         sys.exit(1)
-    
+
     pdf_path = sys.argv[1]
     output_path = sys.argv[2] if len(sys.argv) > 2 else "pdf_content.json"
-    
+
     # Extraction
     pages = extract_pdf_to_json(pdf_path)
-    
+
     # Sauvegarde
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(pages, f, ensure_ascii=False, indent=2)
-    
-    print(f"{len(pages)} pages → {output_path}")
\ No newline at end of file
+
+    print(f"{len(pages)} pages → {output_path}")
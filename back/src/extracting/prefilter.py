@@ -0,0 +1,169 @@
+import re
+import threading
+from collections import OrderedDict, deque
+
+from src.tokens import estimate_tokens
+
+
+# Longueur des radicaux comparés : "Lenght" / "length" → "leng", "vigour" / "vigor" → "vigo"
+STEM_LENGTH = 4
+# Nombre minimal de traits mentionnés pour qu'une page parte au LLM
+DEFAULT_THRESHOLD = 1
+# Pages voisines (avant / après) gardées autour d'une page retenue
+DEFAULT_NEIGHBOURS = 1
+# Pré-filtres gardés en mémoire par `get_prefilter` (listes de traits × versions du référentiel)
+PREFILTER_CACHE_SIZE = 8
+
+# Mots du texte : lettres / chiffres, "_" et "-" séparent (BERRY_K → berry, k)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def stems(text):
+    """Radicaux d'un texte : les mots courts restent entiers, les autres sont tronqués."""
+    return {word[:STEM_LENGTH] for word in WORD_PATTERN.findall(text.lower())}
+
+
+def trait_terms(trait, concepts=()):
+    """
+    Termes recherchés pour un trait : son nom, son trait_id, et le nom +
+    les alias des concepts du référentiel qui le désignent (trait_id ou nom
+    égal au nom / à un alias du concept).
+    """
+    terms = {trait["trait_id"].replace("_", " "), trait.get("description") or ""}
+    keys = {normalize(term) for term in terms}
+    for concept in concepts:
+        names = [concept.name, *concept.aliases]
+        if keys & {normalize(name) for name in names}:
+            terms.update(names)
+    return [term for term in terms if normalize(term)]
+
+
+class PagePrefilter:
+    """
+    Pré-filtre lexical des pages avant l'appel LLM.
+
+    Chaque terme d'un trait est réduit à un ensemble de radicaux ; une page
+    mentionne le trait si tous les radicaux d'un de ses termes y figurent.
+    Le texte de la page est tokenisé une seule fois (regex compilée) et
+    chaque terme est testé par inclusion d'ensembles. Une page est gardée
+    si elle mentionne au moins `threshold` traits ; ses `neighbours` pages
+    voisines de chaque côté sont gardées aussi (tableaux, légendes...).
+    """
+
+    def __init__(self, traits, concepts=(), threshold=DEFAULT_THRESHOLD, neighbours=DEFAULT_NEIGHBOURS):
+        self.threshold = threshold
+        self.neighbours = neighbours
+        self.terms = {
+            t["trait_id"]: [frozenset(stems(term)) for term in trait_terms(t, concepts)]
+            for t in traits
+        }
+
+    def mentions(self, content):
+        """trait_id mentionnés dans la page."""
+        page_stems = stems(content)
+        return [
+            trait_id for trait_id, terms in self.terms.items()
+            if any(term <= page_stems for term in terms)
+        ]
+
+    def score(self, content):
+        return len(self.mentions(content))
+
+    def keep(self, content):
+        return self.score(content) >= self.threshold
+
+    def iter_filtered(self, pages, stats=None):
+        """
+        Générateur : garde les (page_num, content) retenus, dans l'ordre.
+
+        Fonctionne sur un flux (par ex. `iter_pdf_pages`) : seules les
+        `neighbours` dernières pages sont gardées en mémoire. `stats`
+        (ExtractionStats) compte les pages écartées.
+        """
+        before = deque(maxlen=self.neighbours) if self.neighbours else None
+        after = 0
+        for page_num, content in pages:
+            if self.keep(content):
+                if before:
+                    yield from before
+                    before.clear()
+                yield page_num, content
+                after = self.neighbours
+            elif after > 0:
+                yield page_num, content
+                after -= 1
+            else:
+                if before is not None and len(before) == before.maxlen:
+                    self._dropped(before[0][1], stats)
+                elif before is None:
+                    self._dropped(content, stats)
+                if before is not None:
+                    before.append((page_num, content))
+        for _, content in before or ():
+            self._dropped(content, stats)
+
+    def filter_pages(self, pages, stats=None):
+        """Version dict de `iter_filtered` : {page_num: content} → pages retenues."""
+        return dict(self.iter_filtered(sorted(pages.items()), stats))
+
+    @staticmethod
+    def _dropped(content, stats):
+        if stats is not None:
+            stats.pages_filtered += 1
+            stats.tokens_saved += estimate_tokens(content)
+
+
+def build_prefilter(traits, concepts=None, threshold=DEFAULT_THRESHOLD, neighbours=DEFAULT_NEIGHBOURS):
+    """`PagePrefilter` des traits, enrichi des alias du référentiel (chargé si non fourni)."""
+    if concepts is None:
+        try:
+            from src.processing.referential import load_referential
+            concepts = load_referential()
+        except Exception as e:
+            print(f"Référentiel indisponible pour le pré-filtre : {e}")
+            concepts = []
+    return PagePrefilter(traits, concepts, threshold=threshold, neighbours=neighbours)
+
+
+_prefilters = OrderedDict()
+_prefilters_lock = threading.Lock()
+
+
+def referential_file_version():
+    """Version du fichier référentiel : (chemin, date de modification, taille), None s'il manque."""
+    from src.processing.referential import REFERENTIAL_PATH
+    try:
+        st = REFERENTIAL_PATH.stat()
+    except OSError:
+        return None
+    return str(REFERENTIAL_PATH), st.st_mtime_ns, st.st_size
+
+
+def get_prefilter(traits, version=None, concepts=None, threshold=DEFAULT_THRESHOLD, neighbours=DEFAULT_NEIGHBOURS):
+    """
+    `build_prefilter` mis en cache par liste de traits et version du référentiel.
+
+    Le référentiel n'est chargé et l'index des radicaux construit qu'une
+    fois par version. `version` identifie les `concepts` fournis (par ex. la
+    version d'un `ReferentialStore`) ; par défaut, celle du fichier
+    référentiel, qui est alors chargé s'il a changé.
+    """
+    if version is None:
+        version = referential_file_version()
+    # trait_terms n'utilise que le trait_id et la description
+    key = (tuple((t["trait_id"], t.get("description") or "") for t in traits), version, threshold, neighbours)
+    with _prefilters_lock:
+        prefilter = _prefilters.get(key)
+        if prefilter is not None:
+            _prefilters.move_to_end(key)
+            return prefilter
+    prefilter = build_prefilter(traits, concepts, threshold=threshold, neighbours=neighbours)
+    with _prefilters_lock:
+        _prefilters[key] = prefilter
+        while len(_prefilters) > PREFILTER_CACHE_SIZE:
+            _prefilters.popitem(last=False)
+    return prefilter
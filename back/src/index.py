@@ -0,0 +1,306 @@
+from pathlib import Path
+from typing import Optional, Tuple, Union
+import numpy as np
+
+
+# Rows scored per block when the reference matrix is stored in float16
+SCORE_BLOCK_SIZE = 16384
+
+
+def normalize_rows(embeddings: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """
+    L2-normalize the rows of a (n, d) matrix (zero rows are left as is).
+
+    The result is a new C-contiguous array of the requested `dtype`
+    (float32, or float16 to halve the memory footprint).
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(embeddings / norms, dtype=dtype)
+
+
+def _as_queries(queries: np.ndarray) -> np.ndarray:
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[None, :]
+    if queries.ndim != 2:
+        raise ValueError("queries must be 1D (d,) or 2D (m, d)")
+    return normalize_rows(queries)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the `top_k` highest scores along the last axis, best first.
+
+    Uses `np.argpartition` (linear time) and only sorts the `top_k`
+    selected scores, instead of sorting all of them.
+    """
+    scores = np.asarray(scores)
+    n = scores.shape[-1]
+    if top_k >= n:
+        return np.argsort(-scores, axis=-1)
+    part = np.argpartition(-scores, top_k - 1, axis=-1)[..., :top_k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def score_matrix(queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    Similarity scores (m, n) of normalized queries against normalized vectors.
+
+    float16 vectors are up-cast block by block: NumPy has no BLAS kernel for
+    float16, and a full up-cast would defeat the memory saving.
+    """
+    if vectors.dtype == np.float32:
+        return queries @ vectors.T
+    scores = np.empty((len(queries), len(vectors)), dtype=np.float32)
+    for start in range(0, len(vectors), SCORE_BLOCK_SIZE):
+        block = vectors[start:start + SCORE_BLOCK_SIZE].astype(np.float32)
+        scores[:, start:start + SCORE_BLOCK_SIZE] = queries @ block.T
+    return scores
+
+
+class BruteForceIndex:
+    """
+    Exact cosine-similarity search.
+
+    Reference vectors are L2-normalized once at build time, so a query is a
+    single matrix-vector product. Pass `normalized=True` if `embeddings`
+    already are unit vectors of the wanted `dtype` to avoid a copy.
+    """
+
+    kind = "flat"
+
+    def __init__(self, embeddings: np.ndarray, dtype=np.float32, normalized: bool = False):
+        self.vectors = _prepare_vectors(embeddings, dtype, normalized)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the `top_k` nearest references of each query.
+
+        Parameters
+        ----------
+        queries : np.ndarray
+            Shape (d,) or (m, d)
+        top_k : int
+            Number of neighbours per query
+
+        Returns
+        -------
+        scores : np.ndarray
+            Shape (m, k), cosine similarities sorted by descending order
+        indices : np.ndarray
+            Shape (m, k), matching reference row indices
+        """
+        queries = _as_queries(queries)
+        similarity_scores = score_matrix(queries, self.vectors)
+        indices = top_k_indices(similarity_scores, top_k)
+        return np.take_along_axis(similarity_scores, indices, axis=1), indices
+
+    def save(self, dir: Union[str, Path], fingerprint: str = "") -> Path:
+        # Nothing to persist: the vectors are the embedding cache itself
+        return Path(dir)
+
+    @classmethod
+    def load(cls, dir: Union[str, Path], embeddings: np.ndarray, fingerprint: str = "", **params) -> Optional["BruteForceIndex"]:
+        return cls(embeddings, **params)
+
+
+class IVFIndex:
+    """
+    Approximate cosine-similarity search with an inverted file (IVF).
+
+    References are clustered with a spherical k-means into `n_lists`
+    cells. A query is only compared with the references of its `n_probe`
+    closest cells: raising `n_probe` improves recall at the cost of
+    latency (`n_probe == n_lists` is an exact search). `n_lists`, `n_iter`
+    and `seed` are training parameters: a persisted index is only reused
+    when they match.
+    """
+
+    kind = "ivf"
+    filename = "ivf_index.npz"
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 8,
+        n_iter: int = 10,
+        seed: int = 0,
+        dtype=np.float32,
+        normalized: bool = False,
+        _trained: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ):
+        self.vectors = _prepare_vectors(embeddings, dtype, normalized)
+        self.n_probe = n_probe
+        self.training = self.training_params(len(self.vectors), n_lists, n_iter, seed)
+        if _trained is not None:
+            self.centroids, assignments = _trained
+        else:
+            self.centroids, assignments = _spherical_kmeans(self.vectors, *self.training)
+        self._build_lists(assignments)
+
+    @staticmethod
+    def training_params(n: int, n_lists: Optional[int] = None, n_iter: int = 10, seed: int = 0) -> Tuple[int, int, int]:
+        """(cells, k-means iterations, seed) actually used for `n` references."""
+        n_lists = n_lists or max(1, int(np.sqrt(n)))
+        return min(n_lists, n), n_iter, seed
+
+    def _build_lists(self, assignments: np.ndarray) -> None:
+        self.assignments = np.asarray(assignments, dtype=np.int64)
+        # Rows grouped by cell: cell c owns order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(self.assignments, kind="stable")
+        counts = np.bincount(self.assignments, minlength=len(self.centroids))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, top_k: int = 5, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Search the `top_k` approximate nearest references of each query.
+
+        `n_probe` overrides the index default for this call. Returned arrays
+        have the same layout as `BruteForceIndex.search`; rows are padded
+        with score `-inf` and index `-1` when the probed cells hold fewer
+        than `top_k` references.
+        """
+        queries = _as_queries(queries)
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        centroid_scores = queries @ self.centroids.T
+        all_scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        all_indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+        for q, (query, row) in enumerate(zip(queries, centroid_scores)):
+            cells = top_k_indices(row, n_probe)
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+            scores = score_matrix(query[None, :], self.vectors[candidates])[0]
+            best = top_k_indices(scores, top_k)
+            all_scores[q, :len(best)] = scores[best]
+            all_indices[q, :len(best)] = candidates[best]
+        return all_scores, all_indices
+
+    def save(self, dir: Union[str, Path], fingerprint: str = "") -> Path:
+        """Persist the trained cells; the vectors themselves are not duplicated."""
+        save_dir = Path(dir)
+        save_dir.mkdir(parents=True, exist_ok=True)
+        path = save_dir / self.filename
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                n_probe=np.int64(self.n_probe),
+                training=np.asarray(self.training, dtype=np.int64),
+                fingerprint=np.asarray(fingerprint),
+            )
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, dir: Union[str, Path], embeddings: np.ndarray, fingerprint: str = "", **params) -> Optional["IVFIndex"]:
+        """
+        Load a persisted index, or return None if missing, built for other
+        embeddings or trained with other `n_lists` / `n_iter` / `seed`.
+        """
+        path = Path(dir) / cls.filename
+        if not path.exists():
+            return None
+        training = {k: v for k, v in params.items() if k in ("n_lists", "n_iter", "seed")}
+        try:
+            with np.load(path) as data:
+                if str(data["fingerprint"]) != fingerprint or len(data["assignments"]) != len(embeddings):
+                    return None
+                if "training" not in data.files or tuple(data["training"]) != cls.training_params(len(embeddings), **training):
+                    return None
+                trained = (data["centroids"], data["assignments"])
+                n_probe = int(data["n_probe"])
+        except Exception as e:
+            print(f"Error while loading the IVF index, rebuilding it: {e}")
+            return None
+        params = {k: v for k, v in params.items() if k in ("dtype", "normalized")}
+        return cls(embeddings, n_probe=n_probe, _trained=trained, **training, **params)
+
+
+def _spherical_kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster unit vectors by cosine similarity; returns (centroids, assignments)."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    # Train on a sample for large referentials, then assign everything
+    sample = vectors[rng.choice(n, size=min(n, 256 * n_clusters), replace=False)].astype(np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = sample[labels == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # Re-seed empty cells on a random sample point
+                centroids[c] = sample[rng.integers(len(sample))]
+        centroids = normalize_rows(centroids)
+
+    assignments = np.argmax(score_matrix(centroids, vectors), axis=0)
+    return centroids, assignments
+
+
+def _prepare_vectors(embeddings: np.ndarray, dtype, normalized: bool) -> np.ndarray:
+    if normalized and embeddings.dtype == dtype and embeddings.flags.c_contiguous:
+        return embeddings
+    return normalize_rows(embeddings, dtype=dtype)
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (BruteForceIndex, IVFIndex)}
+
+
+def build_index(
+    embeddings: np.ndarray,
+    kind: str = "flat",
+    dir: Optional[Union[str, Path]] = None,
+    fingerprint: str = "",
+    **params,
+):
+    """
+    Build (or load from `dir`) a similarity index over `embeddings`.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        Reference embedding matrix of shape (n, d)
+    kind : str
+        "flat" for exact brute-force search, "ivf" for approximate search
+    dir : str | Path, optional
+        Directory where the index is persisted. A persisted index is
+        reused only if it was built for the same `fingerprint` and with the
+        same training parameters (IVF `n_lists`, `n_iter`, `seed`).
+    fingerprint : str
+        Identifier of the indexed embeddings (e.g. a hash of their keys)
+    **params
+        Extra arguments of the index constructor (e.g. `n_lists`, `n_probe`)
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index kind '{kind}', expected one of {sorted(INDEX_TYPES)}")
+    index_cls = INDEX_TYPES[kind]
+
+    if dir is not None:
+        index = index_cls.load(dir, embeddings, fingerprint=fingerprint, **params)
+        if index is not None:
+            if "n_probe" in params:
+                index.n_probe = params["n_probe"]
+            return index
+
+    index = index_cls(embeddings, **params)
+    if dir is not None:
+        index.save(dir, fingerprint=fingerprint)
+    return index
@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from src.executors import BoundedExecutor, CapacityError
+from src.extracting.Extraction_excel import extract_traits
+from src.extracting.chunking import Chunk, iter_chunks
+from src.extracting.main import DEFAULT_TRAITS, extract_traits_from_pages, iter_pages, load_template
+from src.extracting.pdf_to_text import pdf_page_count
+from src.extracting.prefilter import get_prefilter
+
+
+JOBS_DB_PATH = Path(__file__).resolve().parent.parent / "data" / "jobs" / "jobs.sqlite"
+# Number of extraction jobs running at the same time
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+# Number of jobs waiting for a worker; beyond, `submit` raises `CapacityError`
+JOB_QUEUE = int(os.environ.get("JOB_QUEUE", "16"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobStore:
+    """
+    SQLite persistence of extraction jobs.
+
+    A job keeps its inputs (PDF bytes, optional Excel bytes) so that jobs
+    interrupted by a restart can be run again; they are dropped once the
+    job is done or failed.
+    """
+
+    def __init__(self, path: Union[str, Path] = JOBS_DB_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    pdf BLOB,
+                    excel BLOB,
+                    total_pages INTEGER,
+                    done_pages INTEGER NOT NULL DEFAULT 0,
+                    results TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def create(self, pdf: bytes, excel: Optional[bytes] = None, params: Optional[dict] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, pdf, excel, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(params or {}), pdf, excel, now, now),
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if fields.get("status") in (DONE, FAILED):
+            # Inputs are only needed to run unfinished jobs again
+            fields.update(pdf=None, excel=None)
+        if "results" in fields:
+            fields["results"] = json.dumps(fields["results"], ensure_ascii=False)
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def delete(self, job_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Public view of a job (without its inputs), or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, params, total_pages, done_pages, results, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, status, params, total_pages, done_pages, results, error, created_at, updated_at = row
+        return {
+            "id": job_id,
+            "status": status,
+            "params": json.loads(params),
+            "total_pages": total_pages,
+            "done_pages": done_pages,
+            "progress": done_pages / total_pages if total_pages else 0.0,
+            "results": json.loads(results) if results else [],
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def inputs(self, job_id: str) -> tuple[bytes, Optional[bytes], dict]:
+        with self._lock:
+            pdf, excel, params = self._conn.execute(
+                "SELECT pdf, excel, params FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return pdf, excel, json.loads(params)
+
+    def unfinished(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class JobManager:
+    """
+    Runs extraction jobs in a background worker pool.
+
+    Progress (pages done, partial results) is written to the `JobStore`
+    after every page. `resume()` re-queues the jobs a restart interrupted;
+    their pages already sent to the LLM are answered by the response cache.
+
+    At most `max_workers` jobs run and `max_queue` more wait; beyond that
+    `submit` drops the job and raises `CapacityError`.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, max_workers: int = JOB_WORKERS, max_queue: int = JOB_QUEUE):
+        self.store = store or JobStore()
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = None
+
+    @property
+    def pool(self) -> BoundedExecutor:
+        if self._pool is None:
+            self._pool = BoundedExecutor.threads("job", self.max_workers, self.max_queue)
+        return self._pool
+
+    def submit(
+        self,
+        pdf: bytes,
+        excel: Optional[bytes] = None,
+        max_workers: int = 1,
+        prefilter: bool = False,
+        early_stop: bool = False,
+        chunk_tokens: Optional[int] = None,
+    ) -> str:
+        """
+        Store and queue an extraction job.
+
+        `prefilter`, `early_stop` and `chunk_tokens` are the options of
+        `run_pipeline`, kept in the job params so that a resumed job runs
+        with the settings it was submitted with.
+        """
+        params = {"max_workers": max_workers, "prefilter": prefilter, "early_stop": early_stop, "chunk_tokens": chunk_tokens}
+        job_id = self.store.create(pdf, excel, params=params)
+        try:
+            self.pool.submit(self.run, job_id)
+        except CapacityError:
+            # Refusé : le job n'existe pas pour le client
+            self.store.delete(job_id)
+            raise
+        return job_id
+
+    def resume(self) -> list[str]:
+        job_ids = self.store.unfinished()
+        for job_id in job_ids:
+            self.store.update(job_id, status=QUEUED, done_pages=0)
+            # Jobs déjà admis avant le redémarrage : pas de refus à la reprise
+            self.pool.executor.submit(self.run, job_id)
+        return job_ids
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        return self.pool.stats()
+
+    def run(self, job_id: str) -> None:
+        try:
+            pdf, excel, params = self.store.inputs(job_id)
+            traits = extract_traits(io.BytesIO(excel)) if excel else DEFAULT_TRAITS
+            total_pages = pdf_page_count(pdf)
+            self.store.update(job_id, status=RUNNING, total_pages=total_pages, done_pages=0)
+
+            def on_page(key, found, results):
+                # Progression = dernière page couverte (pages filtrées incluses)
+                last_page = key.last_page if isinstance(key, Chunk) else key
+                self.store.update(job_id, done_pages=last_page, results=list(results.values()))
+
+            pages = iter_pages(pdf)
+            if params.get("prefilter"):
+                pages = get_prefilter(traits).iter_filtered(pages)
+            if params.get("chunk_tokens"):
+                pages = iter_chunks(pages, max_tokens=params["chunk_tokens"])
+            results = extract_traits_from_pages(
+                traits,
+                pages,
+                load_template(),
+                max_workers=params.get("max_workers", 1),
+                on_page=on_page,
+                early_stop=params.get("early_stop", False),
+            )
+            # Pages filtrées ou évitées par l'arrêt anticipé comptent comme traitées
+            self.store.update(job_id, status=DONE, done_pages=total_pages, results=list(results.values()))
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._pool is not None:
+            self._pool.executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,169 @@
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from src.classes import NormalizedVariable, ReferenceConcept
+from src.index import top_k_indices
+
+
+# Character n-gram sizes; words are padded with spaces so that n-grams at a
+# word boundary ("ber" in " ber ") are told apart from inner ones
+NGRAM_SIZES = (3, 4)
+# Words: letters / digits, "_" and "-" separate (BER_MAL_g -> ber, mal, g)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# BM25 parameters (standard values)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Indexed concept fields and the weight of their n-grams. Descriptions are
+# left to the dense retrieval: long free text drowns short acronyms.
+FIELD_WEIGHTS = {"name": 2.0, "aliases": 2.0, "units": 1.0, "methods": 1.0}
+# Reciprocal rank fusion constant (Cormack et al., 2009)
+RRF_K = 60
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = NGRAM_SIZES) -> List[str]:
+    """
+    Character n-grams of the words of `text` (lower-cased).
+
+    Every word is padded with one space on each side; a word shorter than
+    an n-gram size yields itself (padded) for that size, so single-letter
+    tokens such as the "g" of `BER_MAL_g` still count.
+    """
+    grams = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        padded = f" {word} "
+        for n in sizes:
+            if len(padded) <= n:
+                grams.append(padded)
+            else:
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def build_dataset_lexical_string(entry: NormalizedVariable) -> str:
+    """Text of a dataset variable matched against the lexical index."""
+    return " ".join(
+        part.strip() for part in (entry.trait_id, entry.trait, entry.aliases, entry.unit, entry.method) if part
+    )
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over character n-grams of referential concepts.
+
+    Cryptic trait ids (`BER_MAL_g`, `SR_ROT`) embed poorly but share
+    n-grams with the concept aliases, units and methods. Postings are
+    stored as flat arrays (CSR layout, one slice per n-gram) holding the
+    precomputed BM25 weight of each (n-gram, concept) pair, so scoring a
+    query is one vectorized addition per query n-gram.
+
+    Parameters
+    ----------
+    concepts : Sequence[ReferenceConcept]
+        Indexed concepts; search results are indices into this sequence.
+    field_weights : dict
+        Term-frequency weight of each indexed field.
+    """
+
+    def __init__(
+        self,
+        concepts: Sequence[ReferenceConcept],
+        field_weights: Dict[str, float] = FIELD_WEIGHTS,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ):
+        self.vocabulary: Dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_len = np.zeros(len(concepts), dtype=np.float32)
+        for doc, concept in enumerate(concepts):
+            counts = Counter()
+            for field, weight in field_weights.items():
+                value = getattr(concept, field) or []
+                for text in ([value] if isinstance(value, str) else value):
+                    for gram in char_ngrams(text):
+                        counts[gram] += weight
+            for gram, tf in counts.items():
+                term_ids.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+            doc_len[doc] = sum(counts.values())
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        n_docs, n_terms = len(concepts), len(self.vocabulary)
+
+        df = np.bincount(term_ids, minlength=n_terms)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = doc_len.mean() if n_docs else 1.0
+        norm = k1 * (1 - b + b * doc_len / (avg_len or 1.0))
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm[doc_ids])
+
+        order = np.argsort(term_ids, kind="stable")
+        self.indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+        self.doc_ids = doc_ids[order]
+        self.weights = weights[order].astype(np.float32)
+        self.n_docs = n_docs
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    def score(self, text: str) -> np.ndarray:
+        """BM25 score of every concept for a query text, shape (n,)."""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for gram, count in Counter(char_ngrams(text)).items():
+            term = self.vocabulary.get(gram)
+            if term is None:
+                continue
+            start, end = self.indptr[term], self.indptr[term + 1]
+            # A concept appears once per posting list: plain fancy indexing is safe
+            scores[self.doc_ids[start:end]] += count * self.weights[start:end]
+        return scores
+
+    def search(self, texts: Sequence[str], top_k: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k concepts of each query text, best first.
+
+        Returns
+        -------
+        scores, indices : np.ndarray
+            Shape (m, top_k). Concepts sharing no n-gram with the query are
+            not returned: their slots are padded with index -1 (as in
+            `IVFIndex.search`).
+        """
+        top_k = min(top_k, self.n_docs)
+        all_scores = np.zeros((len(texts), top_k), dtype=np.float32)
+        all_idx = np.full((len(texts), top_k), -1, dtype=np.int64)
+        for row, text in enumerate(texts):
+            scores = self.score(text)
+            idx = top_k_indices(scores, top_k)
+            keep = scores[idx] > 0
+            all_scores[row, :keep.sum()] = scores[idx][keep]
+            all_idx[row, :keep.sum()] = idx[keep]
+        return all_scores, all_idx
+
+
+def reciprocal_rank_fusion(rankings: Sequence[np.ndarray], top_k: int = 5, k: int = RRF_K) -> np.ndarray:
+    """
+    Fuse several rankings (concept indices, best first) with reciprocal rank fusion.
+
+    Each ranking adds `1 / (k + rank)` to the concepts it lists (rank
+    starting at 1; -1 padding is ignored). Only ranks are used, so dense
+    cosine and BM25 scores need no calibration against each other.
+
+    Returns
+    -------
+    np.ndarray
+        The `top_k` fused concept indices, best first (ties keep the order
+        of first appearance).
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, i in enumerate(np.asarray(ranking).tolist(), start=1):
+            if i >= 0:
+                fused[i] = fused.get(i, 0.0) + 1.0 / (k + rank)
+    best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return np.asarray(best, dtype=np.int64)
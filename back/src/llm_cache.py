@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from src.cache import CACHE_DIR, SQLiteCache
+
+
+LLM_CACHE_PATH = CACHE_DIR / "llm_responses.sqlite"
+# Set LLM_CACHE=0 to always query the LLM
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") == "1"
+LLM_CACHE_MAX_MB = int(os.environ.get("LLM_CACHE_MAX_MB", "128"))
+LLM_CACHE_TTL_HOURS = float(os.environ.get("LLM_CACHE_TTL_HOURS", str(7 * 24)))
+
+
+def llm_cache_key(
+    model: str,
+    prompt: str,
+    temperature: Optional[float] = None,
+    schema: Optional[dict] = None,
+    params: Optional[dict] = None,
+) -> str:
+    """
+    Hash of everything that determines an LLM response.
+
+    `schema` is the structured-output schema, `params` any other generation
+    parameter (e.g. `{"max_tokens": 2000}`).
+    """
+    request = {"model": model, "prompt": prompt, "temperature": temperature, "schema": schema}
+    if params:
+        request["params"] = params
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Prompt-hash cache of LLM responses, shared by extraction and alignment.
+
+    Responses are stored as text in SQLite, with TTL and size-bounded LRU
+    eviction. `stats()` reports hit/miss counters since process start.
+    """
+
+    def __init__(
+        self,
+        path=LLM_CACHE_PATH,
+        max_bytes: int = LLM_CACHE_MAX_MB * 2**20,
+        ttl: Optional[float] = LLM_CACHE_TTL_HOURS * 3600,
+        enabled: bool = LLM_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.store = SQLiteCache(path, max_bytes=max_bytes, ttl=ttl) if enabled else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.store.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if value is None else value.decode("utf-8")
+
+    def set(self, key: str, response: str) -> None:
+        if self.enabled:
+            self.store.set(key, response.encode("utf-8"))
+
+    def get_or_call(
+        self,
+        call: Callable[[], str],
+        model: str,
+        prompt: str,
+        temperature: Optional[float] = None,
+        schema: Optional[dict] = None,
+        params: Optional[dict] = None,
+    ) -> str:
+        """Return the cached response for this request, or run `call` and cache it."""
+        key = llm_cache_key(model, prompt, temperature, schema, params)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        response = call()
+        self.set(key, response)
+        return response
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": len(self.store) if self.enabled else 0,
+            "bytes": self.store.total_bytes() if self.enabled else 0,
+        }
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+        return _llm_cache
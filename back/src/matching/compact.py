@@ -0,0 +1,94 @@
+import os
+import re
+from typing import List
+
+from src.classes import ReferenceConcept
+from src.tokens import estimate_tokens
+
+
+# Budget (tokens estimés) de chaque concept candidat dans un prompt d'alignement
+ALIGN_CANDIDATE_MAX_TOKENS = int(os.environ.get("ALIGN_CANDIDATE_MAX_TOKENS", "120"))
+# Part du budget d'un concept laissée à chaque liste (unités, méthodes, alias) ;
+# la description prend le reste
+LIST_BUDGET_SHARE = 6
+MIN_LIST_TOKENS = 8
+
+SEPARATOR = "; "
+
+COMPACT_LEGEND = "One block per concept: `ref_id: name`, then units, methods, aliases and description. Long lists are cut, `(+N)` means N more values not shown."
+
+
+def dedupe(values: List[str]) -> List[str]:
+    """Valeurs non vides sans doublon (casse et espaces ignorés), dans l'ordre."""
+    seen, result = set(), []
+    for value in values:
+        value = " ".join(value.split())
+        key = value.lower()
+        if value and key not in seen:
+            seen.add(key)
+            result.append(value)
+    return result
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Coupe `text` entre deux mots pour tenir dans `max_tokens` (suffixe "…")."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = re.split(r"(\s+)", text)
+    kept, used = [], estimate_tokens("…")
+    for word in words:
+        cost = estimate_tokens(word) if word.strip() else 0
+        if used + cost > max_tokens:
+            break
+        kept.append(word)
+        used += cost
+    return "".join(kept).rstrip() + "…"
+
+
+def join_within(values: List[str], max_tokens: int) -> str:
+    """
+    Joint autant de valeurs que possible sous `max_tokens`, puis "(+N)" pour
+    les N valeurs omises. Une première valeur trop longue est tronquée.
+    """
+    kept, used = [], 0
+    for value in values:
+        cost = estimate_tokens(value + SEPARATOR)
+        if used + cost > max_tokens:
+            if not kept:
+                kept.append(truncate_tokens(value, max_tokens))
+            break
+        kept.append(value)
+        used += cost
+    text = SEPARATOR.join(kept)
+    if len(kept) < len(values):
+        text += f" (+{len(values) - len(kept)})"
+    return text
+
+
+def render_reference_compact(reference: ReferenceConcept, max_tokens: int = ALIGN_CANDIDATE_MAX_TOKENS) -> str:
+    """
+    Bloc texte compact d'un concept candidat, d'environ `max_tokens` au plus.
+
+    Remplace le `json.dumps(..., indent=2)` du concept : pas de clés ni
+    d'indentation JSON répétées, valeurs dédoublonnées (les descriptions
+    consolidées sont séparées par "|"), et chaque liste tronquée à sa part
+    du budget. Le ref_id et le nom sont toujours complets.
+    """
+    lines = [f"{reference.ref_id}: {reference.name}"]
+    remaining = max_tokens - estimate_tokens(lines[0])
+    list_tokens = max(MIN_LIST_TOKENS, max_tokens // LIST_BUDGET_SHARE)
+    for label, values in (("units", reference.units), ("methods", reference.methods), ("aliases", reference.aliases)):
+        values = dedupe(values)
+        if not values:
+            continue
+        line = f"  {label}: " + join_within(values, min(list_tokens, max(remaining, MIN_LIST_TOKENS)))
+        lines.append(line)
+        remaining -= estimate_tokens(line)
+    descriptions = dedupe(reference.description.split("|"))
+    if descriptions:
+        lines.append("  description: " + join_within(descriptions, max(remaining, MIN_LIST_TOKENS)))
+    return "\n".join(lines)
+
+
+def render_references_compact(references: List[ReferenceConcept], max_tokens: int = ALIGN_CANDIDATE_MAX_TOKENS) -> str:
+    return "\n".join(render_reference_compact(r, max_tokens) for r in references)
@@ -1,8 +1,13 @@
-from typing import List
+from typing import List, Optional
 import json
+import os
+import threading
 import time
 from pydantic import ValidationError
-from src.classes import AlignmentLLMResponse, AlignmentLLMResponseList, CandidateAlignment, NormalizedVariable, ReferenceConcept
+from src.classes import AlignmentLLMResponse, AlignmentLLMResponseList, BatchAlignmentLLMResponse, CandidateAlignment, NormalizedVariable, ReferenceConcept
+from src.llm_cache import get_llm_cache, llm_cache_key
+from src.matching.compact import ALIGN_CANDIDATE_MAX_TOKENS, COMPACT_LEGEND, render_reference_compact
+from src.tokens import estimate_tokens
 import lmstudio as lms  # SDK LM Studio
 
 SYSTEM_PROMT = """ArithmeticErrorYou are a strict data-alignment system.
@@ -20,38 +25,166 @@ TASK
     - score (float 0–1)
     - why_match (string explaining semantic & contextual reasoning)"""
 
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMT + """
 
-def buildPrompt(variable: NormalizedVariable, references: List[ReferenceConcept]) -> str:
+BATCH
+- Several variables are given, each with a variable_key and its candidate_ref_ids, followed by the reference concepts of all of them.
+- Evaluate each variable independently against its own candidates: only the ref_id listed in its candidate_ref_ids may be returned for it.
+- Return one entry per variable_key, with the items of that variable (same output rules)."""
+
+# Budget (tokens estimés) d'un prompt groupé : consignes + variables + concepts
+ALIGN_BATCH_MAX_TOKENS = int(os.environ.get("ALIGN_BATCH_MAX_TOKENS", "3000"))
+# Nombre maximal de variables par prompt groupé (la réponse grossit avec)
+ALIGN_BATCH_MAX_VARIABLES = int(os.environ.get("ALIGN_BATCH_MAX_VARIABLES", "8"))
+# Rendu des concepts candidats : "compact" (blocs texte tronqués, voir
+# src/matching/compact.py) ou "json" (dump JSON complet indenté)
+ALIGN_PROMPT_FORMAT = os.environ.get("ALIGN_PROMPT_FORMAT", "compact")
+
+
+def render_reference(reference: ReferenceConcept, prompt_format: str = ALIGN_PROMPT_FORMAT) -> str:
+    if prompt_format == "json":
+        return json.dumps(reference.model_dump(), indent=2)
+    return render_reference_compact(reference, ALIGN_CANDIDATE_MAX_TOKENS)
+
+
+def render_references(references: List[ReferenceConcept], prompt_format: str = ALIGN_PROMPT_FORMAT) -> str:
+    if prompt_format == "json":
+        return json.dumps([r.model_dump() for r in references], indent=2)
+    return COMPACT_LEGEND + "\n\n" + "\n".join(render_reference(r, prompt_format) for r in references)
+
+
+def buildPrompt(variable: NormalizedVariable, references: List[ReferenceConcept], prompt_format: str = ALIGN_PROMPT_FORMAT) -> str:
     variable_json = variable.model_dump_json(indent=2)
-    references_json = json.dumps([r.model_dump() for r in references], indent=2)
+    references_text = render_references(references, prompt_format)
     return f"""Here is the variable to categorize:
 
 {variable_json}
 
 Reference concepts:
 
-{references_json}
+{references_text}
 """
 
 
-# Initialisation modèle LM Studio
-model = lms.llm("openai/gpt-oss-20b")
+def variable_key(position: int) -> str:
+    return f"var_{position + 1}"
+
+
+def batch_entry(position: int, variable: NormalizedVariable, references: List[ReferenceConcept]) -> dict:
+    return {
+        "variable_key": variable_key(position),
+        **variable.model_dump(),
+        "candidate_ref_ids": [r.ref_id for r in references],
+    }
+
+
+def buildBatchPrompt(variables: List[NormalizedVariable], references: List[List[ReferenceConcept]], prompt_format: str = ALIGN_PROMPT_FORMAT) -> str:
+    variables_json = json.dumps(
+        [batch_entry(i, v, refs) for i, (v, refs) in enumerate(zip(variables, references))],
+        indent=2,
+        ensure_ascii=False,
+    )
+    # Chaque concept candidat n'apparaît qu'une fois, même partagé
+    union = list({r.ref_id: r for refs in references for r in refs}.values())
+    references_text = render_references(union, prompt_format)
+    return f"""Here are the variables to categorize:
+
+{variables_json}
+
+Reference concepts:
+
+{references_text}
+"""
+
+
+def plan_alignment_batches(
+    variables: List[NormalizedVariable],
+    references: List[List[ReferenceConcept]],
+    max_tokens: int = ALIGN_BATCH_MAX_TOKENS,
+    max_variables: int = ALIGN_BATCH_MAX_VARIABLES,
+    prompt_format: str = ALIGN_PROMPT_FORMAT,
+) -> List[List[int]]:
+    """
+    Regroupe les variables dont les candidats se recouvrent.
+
+    Glouton, dans l'ordre des variables : chaque variable rejoint le groupe
+    avec lequel elle partage le plus de candidats (au moins un), si le
+    prompt groupé reste sous `max_tokens` (chaque concept partagé n'est
+    compté qu'une fois) et sous `max_variables` variables ; sinon elle
+    ouvre un nouveau groupe.
+
+    Args:
+        variables: Variables à aligner.
+        references: Candidats de chaque variable (même ordre).
+
+    Returns:
+        Les groupes, sous forme de listes de positions dans `variables`.
+    """
+    base_tokens = estimate_tokens(BATCH_SYSTEM_PROMPT + buildBatchPrompt([], [], prompt_format))
+    ref_tokens = {}
+    for refs in references:
+        for r in refs:
+            if r.ref_id not in ref_tokens:
+                ref_tokens[r.ref_id] = estimate_tokens(render_reference(r, prompt_format))
+
+    groups = []  # [positions, ref_ids, tokens]
+    for i, (variable, refs) in enumerate(zip(variables, references)):
+        candidates = {r.ref_id for r in refs}
+        var_tokens = estimate_tokens(json.dumps(batch_entry(i, variable, refs), indent=2, ensure_ascii=False))
+        best, best_shared = None, 0
+        for group in groups:
+            positions, ref_ids, tokens = group
+            shared = len(candidates & ref_ids)
+            if shared <= best_shared or len(positions) >= max_variables:
+                continue
+            if tokens + var_tokens + sum(ref_tokens[r] for r in candidates - ref_ids) > max_tokens:
+                continue
+            best, best_shared = group, shared
+        if best is None:
+            groups.append([[i], set(candidates), base_tokens + var_tokens + sum(ref_tokens[r] for r in candidates)])
+        else:
+            best[2] += var_tokens + sum(ref_tokens[r] for r in candidates - best[1])
+            best[0].append(i)
+            best[1] |= candidates
+    return [positions for positions, _, _ in groups]
+
+
+# Modèle LM Studio, chargé au premier appel (pas à l'import)
+MODEL_NAME = "openai/gpt-oss-20b"
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    """LLM partagé par tout le processus, initialisé au premier appel."""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = lms.llm(MODEL_NAME)
+        return _model
 
 
 def align_variable(
     variable: NormalizedVariable,
     references: List[ReferenceConcept],
     max_retries: int = 3,
+    prompt_format: str = ALIGN_PROMPT_FORMAT,
 ) -> AlignmentLLMResponseList:
 
-    prompt = SYSTEM_PROMT + "\n\n" + buildPrompt(variable, references)
+    prompt = SYSTEM_PROMT + "\n\n" + buildPrompt(variable, references, prompt_format)
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(MODEL_NAME, prompt, schema=AlignmentLLMResponseList.model_json_schema())
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return json.loads(cached)
     last_error = None
 
     for _ in range(max_retries):
         try:
             # Utilisation de LM Studio
-            response = model.respond(prompt,response_format=AlignmentLLMResponseList)
+            response = get_model().respond(prompt,response_format=AlignmentLLMResponseList)
             parsed = response.parsed
+            cache.set(cache_key, json.dumps(parsed))
             return parsed
 
         except (json.JSONDecodeError, ValidationError, KeyError) as e:
@@ -61,6 +194,102 @@ def align_variable(
     raise RuntimeError("Invalid JSON from LLM") from last_error
 
 
+
+def align_variable_batch(
+    variables: List[NormalizedVariable],
+    references: List[List[ReferenceConcept]],
+    max_retries: int = 3,
+    prompt_format: str = ALIGN_PROMPT_FORMAT,
+) -> List[Optional[dict]]:
+    """
+    Aligne plusieurs variables en un seul appel au LLM (sortie structurée).
+
+    Le prompt contient chaque concept candidat une seule fois, et pour
+    chaque variable la liste de ses propres candidats. La réponse est une
+    liste indexée par `variable_key` ; une variable dont la réponse cite un
+    ref_id hors de ses candidats est rejetée (None).
+
+    Args:
+        variables: Variables à aligner ensemble (voir `plan_alignment_batches`).
+        references: Candidats de chaque variable (même ordre).
+
+    Returns:
+        Pour chaque variable, le dict `AlignmentLLMResponseList`, ou None si
+        la réponse n'en contient pas, cite un concept qui n'est pas l'un de
+        ses candidats, ou reste invalide après `max_retries` essais :
+        l'appelant repasse alors par `align_variable`.
+    """
+    # Candidats propres à chaque variable, et non l'union du groupe
+    allowed_ids = {variable_key(i): {r.ref_id for r in refs} for i, refs in enumerate(references)}
+    prompt = BATCH_SYSTEM_PROMPT + "\n\n" + buildBatchPrompt(variables, references, prompt_format)
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(MODEL_NAME, prompt, schema=BatchAlignmentLLMResponse.model_json_schema())
+    cached = cache.get(cache_key)
+    parsed = None
+    if cached is not None:
+        parsed = json.loads(cached)
+    else:
+        for _ in range(max_retries):
+            try:
+                response = get_model().respond(prompt, response_format=BatchAlignmentLLMResponse)
+                parsed = BatchAlignmentLLMResponse.model_validate(response.parsed).model_dump()
+                cache.set(cache_key, json.dumps(parsed))
+                break
+            except (json.JSONDecodeError, ValidationError, KeyError, TypeError):
+                time.sleep(0.5)
+    if parsed is None:
+        return [None] * len(variables)
+
+    by_key = {}
+    for entry in parsed["variables"]:
+        allowed = allowed_ids.get(entry["variable_key"], set())
+        # Un concept hors candidats : la réponse de cette variable n'est pas fiable
+        valid = all(item["ref_id"] in allowed for item in entry["items"])
+        by_key.setdefault(entry["variable_key"], {"items": entry["items"]} if valid else None)
+    return [by_key.get(variable_key(i)) for i in range(len(variables))]
+
+
+def align_variables(
+    variables: List[NormalizedVariable],
+    references: List[List[ReferenceConcept]],
+    max_tokens: int = ALIGN_BATCH_MAX_TOKENS,
+    max_retries: int = 3,
+    prompt_format: str = ALIGN_PROMPT_FORMAT,
+) -> List[dict]:
+    """
+    Version groupée de `align_variable` pour une liste de variables.
+
+    Les variables qui partagent des candidats sont alignées ensemble
+    (`align_variable_batch`) ; une variable seule dans son groupe, ou
+    absente d'une réponse groupée, est alignée individuellement.
+    """
+    results = [None] * len(variables)
+    for group in plan_alignment_batches(variables, references, max_tokens=max_tokens, prompt_format=prompt_format):
+        aligned = align_group([variables[i] for i in group], [references[i] for i in group], max_retries, prompt_format)
+        for i, parsed in zip(group, aligned):
+            results[i] = parsed
+    return results
+
+
+def align_group(
+    variables: List[NormalizedVariable],
+    references: List[List[ReferenceConcept]],
+    max_retries: int = 3,
+    prompt_format: str = ALIGN_PROMPT_FORMAT,
+) -> List[dict]:
+    """
+    Aligne un groupe de `plan_alignment_batches` : un seul appel groupé,
+    puis `align_variable` pour chaque variable absente de la réponse.
+    """
+    results = [None] * len(variables)
+    if len(variables) > 1:
+        results = align_variable_batch(variables, references, max_retries, prompt_format)
+    return [
+        parsed if parsed is not None else align_variable(variable, refs, max_retries, prompt_format)
+        for variable, refs, parsed in zip(variables, references, results)
+    ]
+
+
 if __name__ == "__main__":
     variable = NormalizedVariable(
         dataset_id="ds_001",
@@ -82,4 +311,4 @@ if __name__ == "__main__":
         
 
     alignments = align_variable(variable, references)
-    print(alignments)
\ No newline at end of file
+    print(alignments)
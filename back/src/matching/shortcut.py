@@ -0,0 +1,79 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from src.classes import ReferenceConcept
+from src.lexical import WORD_PATTERN
+
+
+# Court-circuit du LLM pour les alignements évidents (ALIGN_SHORTCUT=0 pour le désactiver)
+ALIGN_SHORTCUT = os.environ.get("ALIGN_SHORTCUT", "1") == "1"
+# Règle de marge : similarité cosinus minimale du meilleur candidat...
+SHORTCUT_MIN_SCORE = float(os.environ.get("SHORTCUT_MIN_SCORE", "0.9"))
+# ... et écart minimal avec le deuxième
+SHORTCUT_MIN_MARGIN = float(os.environ.get("SHORTCUT_MIN_MARGIN", "0.08"))
+
+# Raisons enregistrées dans `VariableAlignment.shortcut`
+EXACT_ALIAS = "exact_alias"
+EXACT_NAME = "exact_name"
+SCORE_MARGIN = "score_margin"
+
+
+def normalize_id(text: str) -> str:
+    """Identifiant comparable : minuscules, "_" / "-" / espaces équivalents (BER_MAL_g == ber-mal-g)."""
+    return " ".join(WORD_PATTERN.findall((text or "").lower()))
+
+
+def _unique(matches: List[ReferenceConcept]) -> Optional[ReferenceConcept]:
+    return matches[0] if len(matches) == 1 else None
+
+
+def shortcut_alignment(
+    variable,
+    candidates: Sequence[Tuple[ReferenceConcept, float]],
+    min_score: float = SHORTCUT_MIN_SCORE,
+    min_margin: float = SHORTCUT_MIN_MARGIN,
+) -> Optional[Tuple[dict, str]]:
+    """
+    Aligne une variable sans LLM quand le résultat de la recherche est sans ambiguïté.
+
+    Règles, dans l'ordre :
+      - `exact_alias` : le trait_id (ou un alias) de la variable est un
+        alias d'un seul des candidats ;
+      - `exact_name` : le nom du trait est le nom d'un seul des candidats ;
+      - `score_margin` : le meilleur candidat a une similarité d'au moins
+        `min_score` et dépasse le deuxième d'au moins `min_margin`.
+
+    Args:
+        variable: `NormalizedVariable` à aligner.
+        candidates: (concept, similarité cosinus) issus de `get_best_matches`.
+
+    Returns:
+        (dict `AlignmentLLMResponseList`, raison) ou None si le cas est
+        ambigu et doit passer par `align_variable`.
+    """
+    if not candidates:
+        return None
+    ids = {normalize_id(variable.trait_id)} | {normalize_id(a) for a in (variable.aliases or "").split(",")}
+    ids.discard("")
+    concept = _unique([c for c, _ in candidates if ids & {normalize_id(a) for a in c.aliases}])
+    if concept is not None:
+        why = f"Shortcut ({EXACT_ALIAS}): trait_id '{variable.trait_id}' is an alias of '{concept.name}'"
+        return {"items": [{"ref_id": concept.ref_id, "score": 1.0, "why_description": why}]}, EXACT_ALIAS
+
+    name = normalize_id(variable.trait)
+    concept = _unique([c for c, _ in candidates if name and normalize_id(c.name) == name])
+    if concept is not None:
+        why = f"Shortcut ({EXACT_NAME}): trait '{variable.trait}' is the name of the concept"
+        return {"items": [{"ref_id": concept.ref_id, "score": 1.0, "why_description": why}]}, EXACT_NAME
+
+    ranked = sorted(candidates, key=lambda c: c[1], reverse=True)
+    best, best_score = ranked[0]
+    second_score = ranked[1][1] if len(ranked) > 1 else -1.0
+    if best_score >= min_score and best_score - second_score >= min_margin:
+        why = (
+            f"Shortcut ({SCORE_MARGIN}): similarity {best_score:.3f} >= {min_score} "
+            f"and {best_score - second_score:.3f} above the next candidate"
+        )
+        score = min(max(float(best_score), 0.0), 1.0)
+        return {"items": [{"ref_id": best.ref_id, "score": score, "why_description": why}]}, SCORE_MARGIN
+    return None
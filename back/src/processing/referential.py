@@ -1,9 +1,13 @@
 import json
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List
 from pydantic import ValidationError
 
 from src.classes import ReferenceConcept
+from src.processing.snapshot import SNAPSHOT_DIR, file_digest, load_snapshot, save_snapshot, snapshot_path
+
+
+REFERENTIAL_PATH = Path(__file__).resolve().parent.parent.parent / "data" / "reference" / "raw_vitis_crop_ontology.json"
 
 
 def read_referential_json(fpath: str | Path) -> Dict[str, Any]:
@@ -27,77 +31,83 @@ def read_referential_json(fpath: str | Path) -> Dict[str, Any]:
         raise ValueError(f"Invalid JSON in {p}: {e}") from e
 
 
+def iter_raw_entries(raw_dict: dict) -> Iterator[dict]:
+    """Yield the entries of a raw referential structure (pages of `result` lists)."""
+    for page in raw_dict:
+        entries = page.get("result") if isinstance(page, dict) else None
+        if not entries:
+            continue
+        yield from entries
+
+
 def parse_raw_referential(raw_dict: dict) -> dict:
     """Example parser for the raw referential structure.
 
     This is a minimal implementation that demonstrates safe access
     to the structure; adapt to your actual JSON schema.
     """
-    results = []
-    for page in raw_dict:
-        entries = page.get("result") if isinstance(page, dict) else None
-        if not entries:
-            continue
-        for entry in entries:
-            # placeholder: extract something useful
-            results.append(entry)
+    results = list(iter_raw_entries(raw_dict))
     return {"count": len(results), "items": results}
 
-def convert_entries_to_reference_concepts(entries: List[dict]) -> List[ReferenceConcept]:
+
+def iter_referential_entries(fpaths: Iterable[str | Path]) -> Iterator[dict]:
+    """Yield the entries of several raw referential files, one file in memory at a time."""
+    for fpath in fpaths:
+        yield from iter_raw_entries(read_referential_json(fpath))
+
+
+def convert_entries_to_reference_concepts(entries: Iterable[dict]) -> List[ReferenceConcept]:
     """Convert raw referential entries into `ReferenceConcept` instances.
 
+    Entries are consolidated by characteristic name, in order of first
+    appearance. Units, methods, aliases and descriptions are deduplicated
+    with insertion-ordered sets (dict keys), so the pass is linear in the
+    number of entries; distinct descriptions are joined with '|'.
+
     Mapping:
       - ref_id: 'ref_<index>'
-      - name: item['name']
-      - units: [ item['unit']['name'] ] if present
-      - methods: [ item['method']['name'] ] if present
-      - description: item['alternative_name']
-      - aliases: []
+      - name: item['characteristic']['name']
+      - units: [ item['unit']['name'], ... ]
+      - methods: [ item['method']['name'], ... ]
+      - description: item['alternative_name'] joined with '|'
+      - aliases: [ item['name'], ... ]
     """
     dct = {}
     for entry in entries:
         characteristic = entry.get("characteristic")
-        if isinstance(characteristic, dict):
-            name = characteristic.get("name")
-
-        unit = entry.get('unit').get('name')
-        method = entry.get('method').get('name')
-        description = entry.get("alternative_name")
-        short_name = entry.get("name")
-        if name not in dct:
-            dct[name] = {
-                'name': name,
-                'units': [unit],
-                'methods':[method],
-                'description': description,
-                'aliases': [short_name]
+        name = characteristic.get("name") if isinstance(characteristic, dict) else None
+
+        item = dct.get(name)
+        if item is None:
+            item = dct[name] = {
+                'units': {},
+                'methods': {},
+                'descriptions': {},
+                'aliases': {},
             }
-        else:
-            item = dct[name]
-            if unit not in item['units']:
-                item['units'].append(unit)
-            if method not in item['methods']:
-                item['methods'].append(method)
-            if description not in item['description']:
-                item['description'] += '|'+description
-            if short_name not in item['aliases']:
-                item['aliases'].append(short_name)
-        
+        item['units'][(entry.get('unit') or {}).get('name')] = None
+        item['methods'][(entry.get('method') or {}).get('name')] = None
+        item['descriptions'][entry.get("alternative_name")] = None
+        item['aliases'][entry.get("name")] = None
+
     results = []
-    for i, item in enumerate(dct.values(), start=1):
-        item['ref_id'] = f"ref_{i}"
+    for i, (name, item) in enumerate(dct.items(), start=1):
         try:
-            rc = ReferenceConcept(**item)
+            rc = ReferenceConcept(
+                ref_id=f"ref_{i}",
+                name=name,
+                units=list(item['units']),
+                methods=list(item['methods']),
+                description='|'.join(item['descriptions']),
+                aliases=list(item['aliases']),
+            )
             results.append(rc)
-        except ValidationError:
+        except (TypeError, ValidationError):
             # Skip invalid items but continue processing
             continue
     return results
 
 
-
-
-
 # def convert_entries_to_reference_concepts(entries: List[dict]) -> List[ReferenceConcept]:
 #     """Convert raw referential entries into `ReferenceConcept` instances.
 
@@ -159,14 +169,34 @@ def load_and_convert_referential(fpath: str | Path) -> List[ReferenceConcept]:
 
     Returns the list of successfully converted `ReferenceConcept` instances.
     """
-    raw = read_referential_json(fpath=fpath)
-    parsed = parse_raw_referential(raw)
-    items = parsed.get("items", [])
-    return convert_entries_to_reference_concepts(items)
+    return load_and_convert_referentials([fpath])
 
 
-def load_referential() -> List[ReferenceConcept]:
-    module_dir = Path(__file__).resolve().parent
-    fpath = module_dir.parent.parent / "data" / "reference" / "raw_vitis_crop_ontology.json"
-    return load_and_convert_referential(fpath)
+def load_and_convert_referentials(fpaths: Iterable[str | Path]) -> List[ReferenceConcept]:
+    """Merge several referential JSON files (e.g. crop ontologies) into one list of ReferenceConcepts.
+
+    Concepts sharing a characteristic name across files are consolidated.
+    """
+    return convert_entries_to_reference_concepts(iter_referential_entries(fpaths))
+
+
+def load_referential_snapshot(fpath: str | Path, snapshot_dir: str | Path = SNAPSHOT_DIR) -> List[ReferenceConcept]:
+    """Load a referential through its binary snapshot.
+
+    The snapshot is rebuilt (JSON parse + conversion) when it is missing,
+    from another `SNAPSHOT_VERSION`, or when the content of `fpath` changed.
+    """
+    digest = file_digest(fpath)
+    path = snapshot_path(fpath, snapshot_dir)
+    concepts = load_snapshot(path, digest)
+    if concepts is None:
+        concepts = load_and_convert_referential(fpath)
+        save_snapshot(concepts, path, digest)
+    return concepts
+
+
+def load_referential(use_snapshot: bool = True) -> List[ReferenceConcept]:
+    if use_snapshot:
+        return load_referential_snapshot(REFERENTIAL_PATH)
+    return load_and_convert_referential(REFERENTIAL_PATH)
 
@@ -0,0 +1,117 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from src.cache import CACHE_DIR
+from src.classes import ReferenceConcept
+
+
+# Bump when the snapshot layout or the referential conversion changes
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DIR = CACHE_DIR / "referential"
+
+STRING_FIELDS = ("ref_id", "name", "description")
+LIST_FIELDS = ("units", "methods", "aliases")
+
+
+def file_digest(fpath: str | Path) -> str:
+    """SHA-256 of a file content."""
+    h = hashlib.sha256()
+    with open(fpath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def snapshot_path(fpath: str | Path, snapshot_dir: str | Path = SNAPSHOT_DIR) -> Path:
+    """Snapshot file of a raw referential file."""
+    return Path(snapshot_dir) / f"{Path(fpath).stem}.npz"
+
+
+def _encode_strings(strings: List[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Pack strings as one UTF-8 blob plus character offsets."""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in strings], out=offsets[1:])
+    blob = np.frombuffer("".join(strings).encode("utf-8"), dtype=np.uint8)
+    return blob, offsets
+
+
+def _decode_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    text = blob.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def save_snapshot(concepts: List[ReferenceConcept], path: str | Path, source_digest: str) -> Path:
+    """Write `concepts` as a columnar npz snapshot (atomic replace).
+
+    All strings go to a single UTF-8 blob with offsets, column after column:
+    the scalar fields (one string per concept), then the flattened list
+    fields, whose per-concept lengths are stored in `counts`. Few arrays
+    keep `np.load` cheap.
+
+    Args:
+        concepts: Referential concepts to store.
+        path: Snapshot file path.
+        source_digest: Digest of the raw file the concepts come from.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    strings = [getattr(c, field) for field in STRING_FIELDS for c in concepts]
+    counts = np.array([[len(getattr(c, field)) for c in concepts] for field in LIST_FIELDS], dtype=np.int32)
+    strings += [item for field in LIST_FIELDS for c in concepts for item in getattr(c, field)]
+    blob, offsets = _encode_strings(strings)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            header=np.array([str(SNAPSHOT_VERSION), source_digest]),
+            blob=blob,
+            offsets=offsets,
+            counts=counts.reshape(len(LIST_FIELDS), len(concepts)),
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_snapshot(path: str | Path, source_digest: Optional[str] = None) -> Optional[List[ReferenceConcept]]:
+    """Load a snapshot written by `save_snapshot`.
+
+    Returns None when the file is missing, unreadable, from another
+    `SNAPSHOT_VERSION`, or built from a source other than `source_digest`.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            version, digest = data["header"].tolist()
+            if version != str(SNAPSHOT_VERSION):
+                return None
+            if source_digest is not None and digest != source_digest:
+                return None
+            strings = _decode_strings(data["blob"], data["offsets"])
+            counts = data["counts"].tolist()
+    except Exception as e:
+        print(f"Ignoring unreadable referential snapshot {path}: {e}")
+        return None
+
+    n = len(counts[0])
+    columns = {field: strings[i * n:(i + 1) * n] for i, field in enumerate(STRING_FIELDS)}
+    start = len(STRING_FIELDS) * n
+    for field, field_counts in zip(LIST_FIELDS, counts):
+        grouped = []
+        for count in field_counts:
+            grouped.append(strings[start:start + count])
+            start += count
+        columns[field] = grouped
+
+    # Validation in pydantic-core is faster than model_construct here
+    return [
+        ReferenceConcept(**{field: values[i] for field, values in columns.items()})
+        for i in range(n)
+    ]
@@ -0,0 +1,152 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+
+from src.cache import CACHE_DIR, SQLiteCache
+
+
+QUERY_CACHE_PATH = CACHE_DIR / "query_embeddings.sqlite"
+# Set QUERY_CACHE=0 to embed every query
+QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE", "1") == "1"
+# Entries kept in memory (least recently used evicted first)
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "10000"))
+# Set QUERY_CACHE_DISK=1 to also keep the embeddings across restarts
+QUERY_CACHE_DISK = os.environ.get("QUERY_CACHE_DISK", "0") == "1"
+QUERY_CACHE_MAX_MB = int(os.environ.get("QUERY_CACHE_MAX_MB", "64"))
+
+
+def normalize_query_text(text: str) -> str:
+    """Embedding string with whitespace runs collapsed (line breaks kept)."""
+    return "\n".join(" ".join(line.split()) for line in text.strip().splitlines())
+
+
+def query_cache_key(text: str, model_name: str) -> str:
+    """Hash of a normalized query embedding string for a given model."""
+    return hashlib.sha256(f"{model_name}\n{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query embeddings (dataset variables), keyed by model and text.
+
+    Curators re-align the same variables many times: identical
+    `build_dataset_embedding_string` texts are embedded once. Entries live
+    in an in-process LRU of `max_entries`; with `disk=True` they are also
+    written to a size-bounded SQLite file and survive restarts.
+    `stats()` reports hit/miss counters since process start.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_SIZE,
+        disk: bool = QUERY_CACHE_DISK,
+        path=QUERY_CACHE_PATH,
+        max_bytes: int = QUERY_CACHE_MAX_MB * 2**20,
+        enabled: bool = QUERY_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.store = SQLiteCache(path, max_bytes=max_bytes) if enabled and disk else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                vector = np.frombuffer(value, dtype=np.float32)
+                self._remember(key, vector)
+                with self._lock:
+                    self.disk_hits += 1
+                return vector
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, vector: np.ndarray) -> None:
+        if not self.enabled:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        self._remember(key, vector)
+        if self.store is not None:
+            self.store.set(key, vector.tobytes())
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def embed(self, model, model_name: str, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings of `texts`, shape (m, d), rows aligned with `texts`.
+
+        Cached texts are served from the cache; the misses (deduplicated)
+        are embedded with a single `model.embed` call and cached.
+        """
+        keys = [query_cache_key(text, model_name) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self.get(key) for key in keys]
+        missing = {}
+        for i, (key, vector) in enumerate(zip(keys, vectors)):
+            if vector is None:
+                missing.setdefault(key, []).append(i)
+        if missing:
+            first = [positions[0] for positions in missing.values()]
+            embedded = np.asarray(model.embed([texts[i] for i in first]), dtype=np.float32)
+            if len(embedded) != len(first):
+                raise ValueError("model.embed returned a different number of embeddings than texts.")
+            for (key, positions), vector in zip(missing.items(), embedded):
+                self.set(key, vector)
+                for i in positions:
+                    vectors[i] = vector
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            hits, disk_hits, misses, entries = self.hits, self.disk_hits, self.misses, len(self._entries)
+        lookups = hits + disk_hits + misses
+        return {
+            "enabled": self.enabled,
+            "disk": self.store is not None,
+            "hits": hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (hits + disk_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> QueryEmbeddingCache:
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+        return _query_cache
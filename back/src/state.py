@@ -0,0 +1,274 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from src.classes import ReferenceConcept
+from src.embedding import SemanticEmbedding
+
+
+def concept_key(concept: ReferenceConcept) -> str:
+    """
+    Stable identity of a referential concept: its whitespace-normalized name.
+
+    `ref_id`s are positional (`ref_<index>`), so inserting or removing one
+    concept shifts the ref_id of every later one.
+    """
+    return " ".join(concept.name.split())
+
+
+def concept_hash(concept: ReferenceConcept) -> str:
+    """Content hash of a referential concept (all fields but the positional ref_id)."""
+    return hashlib.sha256(concept.model_dump_json(exclude={"ref_id"}).encode("utf-8")).hexdigest()
+
+
+def concept_hashes(refs: List[ReferenceConcept]) -> Dict[str, str]:
+    """`{concept_key: concept_hash}` of a referential."""
+    return {concept_key(r): concept_hash(r) for r in refs}
+
+
+def diff_referentials(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, List[str]]:
+    """
+    Compare two `{concept_key: concept_hash}` maps (see `concept_hashes`).
+
+    Returns
+    -------
+    dict
+        `added`, `removed` and `changed` concept names, each sorted.
+    """
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": sorted(k for k in new.keys() & old.keys() if new[k] != old[k]),
+    }
+
+
+@dataclass(frozen=True)
+class ReferentialSnapshot:
+    """One immutable version of the referential and its retrieval index.
+
+    `semantic_embedding` is None until the index is built (see
+    `ReferentialStore.warm`): the concepts alone are enough for `/core`.
+    """
+
+    version: int
+    refs: List[ReferenceConcept]
+    semantic_embedding: Optional[SemanticEmbedding]
+    hashes: Dict[str, str] = field(repr=False)
+    loaded_at: float = field(default_factory=time.time)
+
+
+class ReferentialStore:
+    """
+    Holds the current `ReferentialSnapshot` and swaps it atomically on reload.
+
+    Readers take `store.current` once and use that snapshot for the whole
+    request: a reload builds a complete new snapshot (refs, embeddings,
+    index) aside and replaces the reference in one assignment, so in-flight
+    requests never see a mix of two versions. Reloads are serialized.
+
+    Nothing is loaded at construction: the concepts are loaded on first
+    access to `current`, and the index (embedding model + referential
+    embeddings) is built by `warm`, typically in the background.
+    """
+
+    def __init__(self, loader: Callable[[], List[ReferenceConcept]], build: Callable[[List[ReferenceConcept]], SemanticEmbedding]):
+        self.loader = loader
+        self.build = build
+        self._current: Optional[ReferentialSnapshot] = None
+        self._reload_lock = threading.Lock()
+
+    @property
+    def current(self) -> ReferentialSnapshot:
+        if self._current is None:
+            with self._reload_lock:
+                if self._current is None:
+                    refs = self.loader()
+                    self._current = ReferentialSnapshot(
+                        version=1,
+                        refs=refs,
+                        semantic_embedding=None,
+                        hashes=concept_hashes(refs),
+                    )
+        return self._current
+
+    @property
+    def ready(self) -> bool:
+        """True once the current snapshot has its retrieval index."""
+        return self._current is not None and self._current.semantic_embedding is not None
+
+    def warm(self) -> ReferentialSnapshot:
+        """Build the index of the current snapshot if it has none yet."""
+        self.current  # loads the concepts first (takes the lock)
+        with self._reload_lock:
+            if self._current.semantic_embedding is None:
+                self._current = replace(self._current, semantic_embedding=self.build(self._current.refs))
+            return self._current
+
+    def _index_for(self, current: ReferentialSnapshot, refs: List[ReferenceConcept]) -> SemanticEmbedding:
+        if current.semantic_embedding is None:
+            return self.build(refs)
+        return current.semantic_embedding.with_referential(refs)
+
+    def reload(self, refs: Optional[List[ReferenceConcept]] = None) -> dict:
+        """
+        Reload the referential (from `loader` unless `refs` is given).
+
+        Concepts are diffed against the current snapshot by name and
+        content hash; nothing is rebuilt when nothing changed (same
+        concepts with the same ref_ids). Otherwise a
+        new index is built (only concepts with a new embedding string are
+        embedded, see `SemanticEmbedding.with_referential`) and swapped in.
+        A snapshot still without index gets one, so a reload also retries a
+        failed warm-up.
+
+        Returns
+        -------
+        dict
+            `version`, `reloaded`, the `added` / `removed` / `changed`
+            concept names and the `seconds` spent.
+        """
+        start = time.perf_counter()
+        self.current
+        with self._reload_lock:
+            current = self._current
+            refs = self.loader() if refs is None else refs
+            hashes = concept_hashes(refs)
+            diff = diff_referentials(current.hashes, hashes)
+            # A moved concept gets another ref_id: the snapshot must be rebuilt too
+            ref_ids = [(r.ref_id, concept_key(r)) for r in refs]
+            reloaded = any(diff.values()) or ref_ids != [(r.ref_id, concept_key(r)) for r in current.refs]
+            if reloaded:
+                self._current = ReferentialSnapshot(
+                    version=current.version + 1,
+                    refs=refs,
+                    semantic_embedding=self._index_for(current, refs),
+                    hashes=hashes,
+                )
+            elif current.semantic_embedding is None:
+                self._current = replace(current, semantic_embedding=self.build(current.refs))
+        return {
+            "version": self._current.version,
+            "reloaded": reloaded,
+            **diff,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+
+class Warmup:
+    """
+    Timing and status of the named start-up steps, run in the background.
+
+    Each step is `pending`, `running`, `done` or `failed`; `report()` gives
+    the per-step seconds and errors, and `ready` is True once every step
+    is done.
+    """
+
+    def __init__(self, steps: List[str]):
+        self.steps = {name: {"status": "pending", "seconds": None, "error": None} for name in steps}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @contextmanager
+    def step(self, name: str):
+        with self._lock:
+            self.steps[name].update(status="running", error=None)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                self.steps[name].update(status="failed", seconds=round(time.perf_counter() - start, 3), error=str(e))
+            raise
+        with self._lock:
+            self.steps[name].update(status="done", seconds=round(time.perf_counter() - start, 3))
+
+    def run(self, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+        """Run `(name, fn)` steps in order; stops at the first failure."""
+        self.started_at = time.time()
+        try:
+            for name, fn in steps:
+                with self.step(name):
+                    fn()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    def start(self, steps: List[Tuple[str, Callable[[], object]]]) -> None:
+        """`run` in a daemon thread (at most once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(step["status"] == "done" for step in self.steps.values())
+
+    @property
+    def error(self) -> Optional[str]:
+        """Error of the failed step, if any."""
+        with self._lock:
+            return next((f"{name}: {s['error']}" for name, s in self.steps.items() if s["status"] == "failed"), None)
+
+    def report(self) -> dict:
+        with self._lock:
+            steps = {name: dict(step) for name, step in self.steps.items()}
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {"ready": all(s["status"] == "done" for s in steps.values()), "seconds": elapsed, "steps": steps}
+
+
+class ReferentialWatcher:
+    """
+    Polls referential files and reloads the store when one of them changes.
+
+    A change is a different (mtime, size) of any watched file. Runs in a
+    daemon thread; reload errors are logged and retried at the next change.
+    """
+
+    def __init__(self, store: ReferentialStore, paths: List[Union[str, Path]], interval: float = 5.0):
+        self.store = store
+        self.paths = [Path(p) for p in paths]
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._stat()
+
+    def _stat(self):
+        signature = []
+        for path in self.paths:
+            try:
+                st = path.stat()
+                signature.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        return signature
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            signature = self._stat()
+            if signature == self._signature:
+                continue
+            self._signature = signature
+            try:
+                print(f"Referential reloaded: {self.store.reload()}")
+            except Exception as e:
+                print(f"Referential reload failed: {e}")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="referential-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
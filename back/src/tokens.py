@@ -0,0 +1,32 @@
+import math
+import re
+
+
+# Average number of characters per BPE token on English/French prose
+CHARS_PER_TOKEN = 4
+
+_WORD_OR_SYMBOL = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens of `text` without a tokenizer.
+
+    Each word counts one token per `CHARS_PER_TOKEN` characters (rounded
+    up) and each punctuation or markdown symbol counts one token. Close
+    enough to BPE tokenizers to budget prompts; deterministic and fast.
+
+    Parameters
+    ----------
+    text : str
+        Text to measure.
+
+    Returns
+    -------
+    int
+        Estimated token count.
+    """
+    return sum(
+        math.ceil(len(piece) / CHARS_PER_TOKEN) if piece[0].isalnum() or piece[0] == "_" else 1
+        for piece in _WORD_OR_SYMBOL.findall(text)
+    )
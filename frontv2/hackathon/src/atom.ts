@@ -100,6 +100,41 @@ export class ApiHelper {
     });
   }
 
+  // Server-sent events from /uploadfile/stream: onVariables is called with the
+  // merged variables after each page, then once more with the final state.
+  static async streamFile(
+    file: File,
+    onVariables: (variables: TNormalizedVariableAPI[]) => void,
+  ) {
+    const formData = new FormData();
+    formData.append("file", file);
+    const response = await fetch(`${HOST}/uploadfile/stream`, {
+      method: "POST",
+      body: formData,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`upload failed: ${response.status}`);
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = "";
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+      const events = buffer.split("\n\n");
+      buffer = events.pop() ?? "";
+      for (const raw of events) {
+        const lines = raw.split("\n");
+        const event = lines.find((l) => l.startsWith("event:"))?.slice(6).trim();
+        const data = lines.find((l) => l.startsWith("data:"))?.slice(5);
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === "error") throw new Error(payload.detail);
+        onVariables(payload.variables);
+      }
+    }
+  }
+
   static async getMapping(variable: TNormalizedVariable) {
     return axios.post<{items:TMappingAPI[]}>(`${HOST}/align`, {...variable,aliases:""});
   }
@@ -11,24 +11,32 @@ export default function UploadArea() {
     if (e.target.files?.[0]) {
       setFile(e.target.files[0]);
       setIsLoading(true);
-      await ApiHelper.postFile(e.target.files?.[0])
-        .then((result) => {
-          console.log(result.data.variables);
-          getDefaultStore().set(
-            variableImportAtom,
-            result.data.variables.map((elt) => ({
-              description: elt.description ?? "",
-              method: elt.method ?? "",
-              trait_id: elt.trait_id ?? "",
-              unit: elt.unit ?? "",
-              data_import_id: crypto.randomUUID(),
-              dataset_id: e.target.files![0].name,
-              trait: elt.trait ?? "",
-              aliases:"",
-            })),
-          );
-          console.log("upload complete");
-        })
+      const datasetId = e.target.files[0].name;
+      // One UUID per trait for the whole upload: rows keep their id from one
+      // streamed update to the next
+      const importIds = new Map<string, string>();
+      const importId = (traitId: string) => {
+        if (!traitId) return crypto.randomUUID();
+        if (!importIds.has(traitId)) importIds.set(traitId, crypto.randomUUID());
+        return importIds.get(traitId)!;
+      };
+      await ApiHelper.streamFile(e.target.files[0], (variables) => {
+        getDefaultStore().set(
+          variableImportAtom,
+          variables.map((elt) => ({
+            description: elt.description ?? "",
+            method: elt.method ?? "",
+            trait_id: elt.trait_id ?? "",
+            unit: elt.unit ?? "",
+            data_import_id: importId(elt.trait_id ?? ""),
+            dataset_id: datasetId,
+            trait: elt.trait ?? "",
+            aliases: "",
+          })),
+        );
+      })
+        .then(() => console.log("upload complete"))
+        .catch((err) => console.error(err))
         .finally(() => setIsLoading(false));
     }
   };